@@ -1,59 +1,131 @@
+import asyncio
 import logging
+import os
 import time
 
+from requests import RequestException
 from selenium.common import TimeoutException
 
-from utils.driver import driver
-from utils.helper_functions import (
+from app.utils.driver import get_driver
+from app.utils.helper_functions import (
+    get_model,
     predict_winner,
+    prediction_cache_info,
+    name_resolution_info,
+    set_win_rates,
     calculate_bet,
     int_to_money,
     money_to_int,
 )
-from utils.settings import settings
-from utils.state_machine import StateMachine
+from app.utils.model_registry import ModelRegistry
+from app.utils.ratings import EloRatings
+from app.utils.settings import settings
+from app.utils.state_machine import StateMachine
+from app.utils.win_rates import WinRateTable
 from website.webserver import WebServer
 
 # Import the database if we have a DSN
 if settings.PG_DSN is not None:
-    import utils.database as db
+    import app.utils.database as db
+
+async def place_bet(bet, team, num_retries=3):
+    """
+    Places a bet, retrying on timeouts.
+
+    Returns
+    -------
+    bool
+        Whether the bet was placed.
+    """
+    for i in range(num_retries):
+        try:
+            if await asyncio.to_thread(get_driver().place_bet, bet, team):
+                return True
+
+            # Rejected by the site, retrying won't change that
+            logging.error(f"Bet of {bet} on {team} was not accepted")
+            return False
+        except (TimeoutException, RequestException) as e:
+            if i == num_retries - 1:
+                # We have retried too many times, skip this match
+                logging.error(f"Failed to place bet: {e}")
+
+    return False
+
+
+async def main():
+    # Start the browser and load the model before the first match needs them
+    driver, _ = await asyncio.gather(asyncio.to_thread(get_driver), asyncio.to_thread(get_model))
+
+    # Load new model versions in the background, they are swapped in between matches
+    registry = None
+    if settings.WATCH_MODELS:
+        registry = ModelRegistry()
+        registry.start()
 
-
-def main():
     # Start the state machine
     machine = StateMachine()
     machine.start()
     states = machine.States
 
-    # Start the web server
+    # Start the web server, publishing only queues the updates
     webserver = WebServer()
     webserver.start()
 
+    # Start the database writer
+    if settings.PG_DSN is not None:
+        match_writer = db.MatchWriter()
+        match_writer.start()
+
+    # Predict unknown characters from their win rates, kept up to date as matches finish
+    win_rates = WinRateTable()
+    if settings.PG_DSN is not None:
+        win_rates = await asyncio.to_thread(WinRateTable.from_database, db.get_engine())
+    set_win_rates(win_rates)
+
+    # Online ratings, updated at every payout
+    if os.path.exists(settings.RATINGS_PATH):
+        ratings = await asyncio.to_thread(EloRatings.load, settings.RATINGS_PATH)
+    else:
+        ratings = EloRatings()
+
     # Initialize the session variables
     session_winnings = 0
-    web_json = {}
+    web_json = {"balance": int_to_money(await asyncio.to_thread(driver.get_balance))}
     start_time = None
     num_matches = 0
     num_correct = 0
     bets_started = False
 
     while True:
-        web_json["balance"] = int_to_money(driver.get_balance())
         webserver.publish(web_json, event_type="main")
-        state = machine.await_next_state()
+        state = await asyncio.to_thread(machine.await_next_state)
 
         match state:
             case states.BETS_OPEN:
                 bets_started = True
-                # Get the current match up
-                red, blue = driver.get_match_up()
+                opened_at = machine.state_changed_at
+
+                # Get the current match up while reading the balance and tournament status
+                (red, blue), snapshot = await asyncio.gather(
+                    asyncio.to_thread(driver.get_match_up),
+                    asyncio.to_thread(driver.snapshot, require=("balance",)),
+                )
 
                 # Predict the winner
-                conf, team = predict_winner(red, blue)
+                conf, team = await asyncio.to_thread(predict_winner, red, blue)
+                conf, team = ratings.blend(conf, team, red, blue, settings.RATINGS_WEIGHT)
+                logging.debug(f"Prediction cache: {prediction_cache_info()}")
+                logging.debug(f"Name resolution: {name_resolution_info()}")
 
                 # Calculate the bet amount
-                balance = driver.get_balance()
-                is_tournament = driver.is_tournament()
+                balance = snapshot.balance
+                is_tournament = snapshot.is_tournament
+                if balance <= 0:
+                    # The bet size depends on the balance, don't guess
+                    logging.warning("Failed to read the balance, skipping this match")
+                    bets_started = False
+                    continue
                 if conf > 0:
                     bet = calculate_bet(balance, conf, is_tournament)
                 else:
@@ -61,26 +133,21 @@ def main():
                     bet = 1
 
                 # Place a bet
-                flag = False
-                num_retrys = 3
-                for i in range(num_retrys):
-                    try:
-                        driver.place_bet(bet, team)
-                    except TimeoutException as e:
-                        if i == num_retrys - 1:
-                            # We have retried too many times, skip this match
-                            logging.error(f"Failed to place bet: {e}")
-                            flag = True
-                if flag:
+                if not await place_bet(bet, team):
                     continue
 
+                bet_latency = time.time() - opened_at
+                logging.info(f"Bet placed {bet_latency:.3f}s after bets opened")
+
                 # Update the web json with the new data
+                web_json["balance"] = int_to_money(balance)
                 web_json["red"] = red
                 web_json["blue"] = blue
                 web_json["bet"] = int_to_money(bet)
                 web_json["team_bet_on"] = team
                 web_json["confidence"] = f"{conf:.2%}"
                 web_json["is_tournament"] = is_tournament
+                web_json["bet_latency"] = f"{bet_latency:.3f}s"
 
             case states.BETS_CLOSED:
                 if not bets_started:
@@ -88,8 +155,9 @@ def main():
                 # Start timer for match duration
                 start_time = time.time()
 
-                red_pot, blue_pot = driver.get_pots()
-                red_odds, blue_odds = driver.get_odds()
+                snapshot = await asyncio.to_thread(driver.snapshot, require=("odds", "lastbet"))
+                red_pot, blue_pot = snapshot.red_pot, snapshot.blue_pot
+                red_odds, blue_odds = snapshot.red_odds, snapshot.blue_odds
 
                 # Get the popular team
                 popular_team = "red" if red_pot > blue_pot else "blue"
@@ -104,6 +172,7 @@ def main():
                     payout = bet * popular_odds
 
                 # Update the web json with the new data
+                web_json["balance"] = int_to_money(snapshot.balance)
                 web_json["red_pot"] = int_to_money(red_pot)
                 web_json["blue_pot"] = int_to_money(blue_pot)
                 web_json["red_odds"] = red_odds
@@ -116,11 +185,10 @@ def main():
                 # Calculate the match duration
                 match_duration = time.time() - start_time
 
-                # Get the winner
-                winner = driver.get_winner()
-
-                # Get the payout
-                payout = driver.get_payout()
+                # Get the winner and the payout from a single read of the page
+                snapshot = await asyncio.to_thread(driver.snapshot, require=("winner",))
+                winner = snapshot.winner
+                payout = driver.get_payout(snapshot)
 
                 # Add the payout to the session winnings
                 session_winnings += payout
@@ -135,6 +203,7 @@ def main():
                 red, blue = web_json["red"], web_json["blue"]
                 pots = money_to_int(web_json["red_pot"]), money_to_int(web_json["blue_pot"])
                 web_json = {
+                    "balance": int_to_money(snapshot.balance),
                     "session_winnings": int_to_money(session_winnings),
                     "match_duration": f"{match_duration:.2f}",
                     "accuracy": f"{accuracy:.2%}",
@@ -150,15 +219,25 @@ def main():
                 if settings.PG_DSN is not None and ("Team" not in red or "Team" not in blue):
                     # Add the match to the database if we have a DSN
                     # And if the match is not an exhibition match
-                    db.add_match(red, blue, winner, pots)
+                    match_writer.submit(red, blue, winner, pots)
+
+                if "Team" not in red or "Team" not in blue:
+                    win_rates.record(red, blue, winner)
+                    ratings.update(red, blue, winner)
+                    await asyncio.to_thread(ratings.save, settings.RATINGS_PATH)
 
                 # Reset the bets started flag
                 bets_started = False
 
+                # Nothing is predicted until the next match opens, swap in a new model if one is ready
+                if registry is not None:
+                    registry.swap()
+
 
 if __name__ == '__main__':
     try:
-        main()
+        asyncio.run(main())
     except Exception as e:
-        driver.__del__()  # Close the browser
+        if get_driver.is_initialized():
+            get_driver().__del__()  # Close the browser
         raise e
@@ -0,0 +1,142 @@
+import logging
+import os
+import random
+
+import numpy as np
+
+from app.utils.vocab import load_vocab
+
+DENSE_FILE = "confidence_matrix.npy"
+PAIRS_FILE = "confidence_pairs.npy"
+VALUES_FILE = "confidence_values.npy"
+
+
+def matrix_size(characters):
+    """
+    Number of rows and columns of the matrix for a vocab, the embedding indices run from 0 to the largest id.
+    """
+    return max(characters.values()) + 1
+
+
+class ConfidenceMatrix:
+    """
+    Precomputed probabilities of red winning for every (red, blue) pair of a model.
+
+    The arrays are memory-mapped, so every process reading the same model directory shares one copy.
+    Built by ``model_dev/export_confidence_matrix.py``.
+
+    Parameters
+    ----------
+    model_dir : str
+        Directory holding the exported matrix and the vocab.
+    """
+
+    def __init__(self, model_dir):
+        self.model_dir = model_dir
+
+        self.characters = load_vocab(model_dir)
+        self.size = matrix_size(self.characters)
+
+        dense_path = os.path.join(model_dir, DENSE_FILE)
+        if os.path.exists(dense_path):
+            self.dense = np.load(dense_path, mmap_mode='r')
+            self.pairs = self.values = None
+        else:
+            # Sparse matrix of the observed pairs, sorted by their key red * size + blue
+            self.dense = None
+            self.pairs = np.load(os.path.join(model_dir, PAIRS_FILE), mmap_mode='r')
+            self.values = np.load(os.path.join(model_dir, VALUES_FILE), mmap_mode='r')
+
+    @staticmethod
+    def exists(model_dir):
+        """
+        Whether a matrix was exported for the model in `model_dir`.
+        """
+        return any(os.path.exists(os.path.join(model_dir, name)) for name in (DENSE_FILE, PAIRS_FILE))
+
+    def red_win_prob(self, red_idx, blue_idx):
+        """
+        Look up the probability of red winning.
+
+        Parameters
+        ----------
+        red_idx : np.ndarray or int
+            Indices of the red characters.
+        blue_idx : np.ndarray or int
+            Indices of the blue characters.
+
+        Returns
+        -------
+        np.ndarray
+            Probability of red winning, NaN for ids outside the matrix and pairs missing from a sparse matrix.
+        """
+        red_idx, blue_idx = np.broadcast_arrays(
+            np.asarray(red_idx, dtype=np.int64), np.asarray(blue_idx, dtype=np.int64)
+        )
+
+        size = self.dense.shape[0] if self.dense is not None else self.size
+        in_range = (red_idx >= 0) & (red_idx < size) & (blue_idx >= 0) & (blue_idx < size)
+        is_empty = self.dense.size == 0 if self.dense is not None else len(self.pairs) == 0
+        if is_empty or not in_range.any():
+            return np.full(red_idx.shape, np.nan)
+
+        # Look up a valid cell for the ids out of range, masked below
+        red_idx, blue_idx = np.where(in_range, red_idx, 0), np.where(in_range, blue_idx, 0)
+
+        if self.dense is not None:
+            return np.where(in_range, self.dense[red_idx, blue_idx], np.nan)
+
+        keys = red_idx * self.size + blue_idx
+        pos = np.searchsorted(self.pairs, keys)
+        pos = np.minimum(pos, len(self.pairs) - 1)
+        found = in_range & (self.pairs[pos] == keys)
+        return np.where(found, self.values[pos], np.nan)
+
+    def predict(self, red_idx, blue_idx):
+        """
+        Vectorized prediction with the same outputs as ``utils.simulation.predict_confidences``.
+
+        Returns
+        -------
+        conf : np.ndarray
+            Confidence of the prediction for every match, -1 for pairs missing from a sparse matrix like
+            `predict_winner`.
+        team : np.ndarray
+            Predicted winner for every match, 0 for red and 1 for blue. Meaningless where `conf` is -1.
+        """
+        p_red = self.red_win_prob(red_idx, blue_idx)
+        team = (p_red < 0.5).astype(np.int8)
+        conf = np.where(team == 0, p_red, 1 - p_red)
+        conf[np.isnan(p_red)] = -1
+        return conf, team
+
+    def predict_winner(self, red, blue):
+        """
+        Drop-in replacement for `app.utils.helper_functions.predict_winner`.
+
+        Parameters
+        ----------
+        red : str
+            The name of the red character.
+        blue : str
+            The name of the blue character.
+
+        Returns
+        -------
+        conf : float
+            The confidence of the prediction.
+        team : str
+            The predicted winner.
+        """
+        try:
+            red_idx = self.characters[red]
+            blue_idx = self.characters[blue]
+        except KeyError:
+            logging.warning(f"Unknown character in match up: {red} vs. {blue}")
+            return -1, random.choice(["red", "blue"])
+
+        p_red = float(self.red_win_prob(red_idx, blue_idx))
+        if np.isnan(p_red):
+            return -1, random.choice(["red", "blue"])
+
+        return (p_red, "red") if p_red >= 0.5 else (1 - p_red, "blue")
@@ -1,18 +1,27 @@
 import logging
+import threading
 import time
+from typing import Optional
 
 import sqlalchemy
-from sqlalchemy import ForeignKey, select, Identity
-from sqlalchemy.exc import NoResultFound, OperationalError
+from sqlalchemy import ForeignKey, Identity, Integer, SmallInteger, String, column, func, select, text, update, values
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
 from sqlalchemy.orm import Mapped, DeclarativeBase, mapped_column, Session
 
+from app.utils.lazy import lazy_singleton
 from app.utils.settings import settings
+from app.utils.spool import MatchSpool
 
 
 class Base(DeclarativeBase):
     pass
 
 
+# Integer encoding of Match.winner
+WINNER_CODES = {"red": 0, "blue": 1}
+
+
 class Character(Base):
     """
     SQL table for characters.
@@ -50,6 +59,14 @@ class Match(Base):
         Name of the blue team.
     winner : str
         Name of the winning team.
+    spool_id : str or None
+        ID of the local spool record the match was written from, used to deduplicate replays.
+    red_id : int or None
+        ID of the red character, denormalized so queries can join on integers. None until backfilled.
+    blue_id : int or None
+        ID of the blue character. None until backfilled.
+    winner_code : int or None
+        Winning team, 0 for red and 1 for blue, see `WINNER_CODES`. None for ties or until backfilled.
     """
     __tablename__ = 'matches'
 
@@ -57,6 +74,10 @@ class Match(Base):
     red: Mapped[str] = mapped_column(ForeignKey("characters.name"), nullable=False)
     blue: Mapped[str] = mapped_column(ForeignKey("characters.name"), nullable=False)
     winner: Mapped[str] = mapped_column(nullable=False)
+    spool_id: Mapped[Optional[str]] = mapped_column(nullable=True, unique=True, index=True)
+    red_id: Mapped[Optional[int]] = mapped_column(nullable=True, index=True)
+    blue_id: Mapped[Optional[int]] = mapped_column(nullable=True, index=True)
+    winner_code: Mapped[Optional[int]] = mapped_column(SmallInteger, nullable=True)
 
     def __str__(self):
         return f"{self.red} vs. {self.blue}: {self.winner.capitalize()} wins!"
@@ -81,7 +102,7 @@ class MatchMetadata(Base):
     __tablename__ = 'match_metadata'
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    match_id: Mapped[int] = mapped_column(ForeignKey("matches.id"), nullable=False)
+    match_id: Mapped[int] = mapped_column(ForeignKey("matches.id"), nullable=False, index=True)
     red_pot: Mapped[int] = mapped_column(nullable=False)
     blue_pot: Mapped[int] = mapped_column(nullable=False)
 
@@ -119,15 +140,112 @@ class ModelMetadata(Base):
     payout: Mapped[int] = mapped_column(nullable=False)
 
 
-def update_character(session: Session, name: str, is_winner: bool):
-    try:
-        character = session.query(Character).filter_by(name=name).one()
-        character.num_wins += int(is_winner)
-        character.num_matches += 1
-    except NoResultFound:
-        # Character does not exist in database, so add it
-        character = Character(name=name, num_wins=int(is_winner), num_matches=1)
-        session.add(character)
+def write_matches(session, matches):
+    """
+    Write a batch of matches in a handful of statements, reading back only the character and match ids.
+
+    Parameters
+    ----------
+    session : Session
+        Session to write with, the caller commits.
+    matches : list[tuple[str, str, str, tuple[int, int] or None, str or None]]
+        The (red, blue, winner, pots, spool_id) of each match, see `add_match`.
+        Matches whose spool id is already in the database are skipped.
+    """
+    # Skip matches written by a previous flush that was not acknowledged
+    spool_ids = [match[4] for match in matches if match[4] is not None]
+    if spool_ids:
+        written = set(session.scalars(select(Match.spool_id).where(Match.spool_id.in_(spool_ids))))
+        matches = [match for match in matches if match[4] is None or match[4] not in written]
+        if not matches:
+            return
+
+    # Total the character updates, an upsert may only touch each row once
+    counts = {}
+    for red, blue, winner, _, _ in matches:
+        for name, is_winner in zip((red, blue), (winner == 'red', winner == 'blue')):
+            num_wins, num_matches = counts.get(name, (0, 0))
+            counts[name] = (num_wins + int(is_winner), num_matches + 1)
+
+    # Only insert the new characters, an insert draws an id from the sequence even for a conflicting row and the
+    # model sizes its embeddings by the largest id
+    character_ids = dict(session.execute(
+        select(Character.name, Character.id).where(Character.name.in_(counts))
+    ).all())
+    missing = [name for name in counts if name not in character_ids]
+    if missing:
+        character_ids.update(session.execute(
+            insert(Character).values([{"name": name, "num_wins": 0, "num_matches": 0} for name in missing])
+            .on_conflict_do_nothing(index_elements=[Character.name])
+            .returning(Character.name, Character.id)
+        ).all())
+
+        # Added by another writer in the meantime
+        missing = [name for name in missing if name not in character_ids]
+        if missing:
+            character_ids.update(session.execute(
+                select(Character.name, Character.id).where(Character.name.in_(missing))
+            ).all())
+
+    # Update the records of every character at once
+    new_counts = values(
+        column("name", String), column("num_wins", Integer), column("num_matches", Integer), name="new_counts"
+    ).data([(name, num_wins, num_matches) for name, (num_wins, num_matches) in counts.items()])
+    session.execute(
+        update(Character).where(Character.name == new_counts.c.name).values(
+            num_wins=Character.num_wins + new_counts.c.num_wins,
+            num_matches=Character.num_matches + new_counts.c.num_matches,
+        )
+    )
+
+    # Add the matches into the database
+    match_ids = session.scalars(
+        insert(Match).returning(Match.id, sort_by_parameter_order=True),
+        [
+            {
+                "red": red,
+                "blue": blue,
+                "winner": winner,
+                "spool_id": spool_id,
+                "red_id": character_ids[red],
+                "blue_id": character_ids[blue],
+                "winner_code": WINNER_CODES.get(winner),
+            }
+            for red, blue, winner, _, spool_id in matches
+        ],
+    ).all()
+
+    # Add match metadata into the database
+    metadata = [
+        {"match_id": match_id, "red_pot": pots[0], "blue_pot": pots[1]}
+        for match_id, (_, _, _, pots, _) in zip(match_ids, matches)
+        if pots is not None and (pots[0] != 0 and pots[1] != 0)
+    ]
+    if metadata:
+        session.execute(insert(MatchMetadata), metadata)
+
+
+def _write_with_retries(matches, commit=True, num_retries=3):
+    for i in range(num_retries):
+        try:
+            with Session(get_engine()) as session:
+                write_matches(session, matches)
+
+                if commit:
+                    session.commit()
+
+                logging.info(f"Added {len(matches)} match(es) successfully.")
+                return  # No error, so return
+
+        except OperationalError as e:
+            if i == num_retries - 1:
+                # Final retry, raise the exception
+                raise e
+
+            # Otherwise, retry after a short wait
+            wait_time = 2 ** (i - 1)
+            logging.warning(f"OperationalError: {e}. Retrying in {wait_time} seconds...")
+            time.sleep(wait_time)
 
 
 def add_match(red, blue, winner, pots=None, commit=True, num_retries=3):
@@ -149,43 +267,244 @@ def add_match(red, blue, winner, pots=None, commit=True, num_retries=3):
     num_retries: int, default=3
         Number of times to retry the operation if there is a disconnection error.
     """
-
-    for i in range(num_retries):
+    _write_with_retries([(red, blue, winner, pots, None)], commit=commit, num_retries=num_retries)
+
+
+class MatchWriter:
+    def __init__(self, spool_path=settings.SPOOL_PATH, batch_size=100, flush_interval=5, max_backoff=60):
+        """
+        Spools finished matches to a local file and flushes them to Postgres in batches on a background thread.
+
+        Callers never wait on Postgres, and matches survive database outages and restarts.
+
+        Parameters
+        ----------
+        spool_path : str, default=settings.SPOOL_PATH
+            SQLite file to spool matches to.
+        batch_size : int, default=100
+            Maximum number of matches written per transaction.
+        flush_interval : float, default=5
+            Time between flush attempts when nothing new was submitted (seconds).
+        max_backoff : float, default=60
+            Longest wait between flush attempts while the database is unreachable (seconds).
+        """
+        self.spool = MatchSpool(spool_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+
+        self._wake = threading.Event()
+        self._wake.set()  # Flush whatever a previous run left behind
+        self._thread_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """
+        Starts the flusher thread.
+        """
+        self._thread.start()
+
+    def is_alive(self):
+        """
+        Whether the flusher thread is running.
+        """
+        return self._thread.is_alive()
+
+    def ensure_running(self):
+        """
+        Restart the flusher thread if it died.
+        """
+        with self._thread_lock:
+            if self._thread.ident is None or self._thread.is_alive():
+                return
+
+            logging.error("The match writer thread died, restarting it.")
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def submit(self, red, blue, winner, pots=None):
+        """
+        Spool a match to be written, see `add_match` for the parameters.
+        """
+        self.spool.append(red, blue, winner, pots)
+        self.ensure_running()
+        self._wake.set()
+
+    def _flush(self, records):
+        """
+        Write spooled records and remove them from the spool.
+
+        A batch Postgres refuses for another reason than being unreachable is retried record by record, and the
+        records that still fail are moved to the spool's dead letter table. Transient errors are raised.
+        """
         try:
-            with Session(engine) as session:
-                # Add character into database
-                for name, is_winner in zip((red, blue), (winner == 'red', winner == 'blue')):
-                    update_character(session, name, is_winner)
-
-                # Add match into database
-                session.add(Match(red=red, blue=blue, winner=winner))
-
-                # Add match metadata into database
-                if pots is not None and (pots[0] != 0 and pots[1] != 0):
-                    red_pot, blue_pot = pots
-                    match_id = max(session.execute(select(Match.id)).scalars())
-                    session.add(MatchMetadata(
-                        match_id=match_id,
-                        red_pot=red_pot,
-                        blue_pot=blue_pot
-                    ))
+            with Session(get_engine()) as session:
+                write_matches(session, [match for _, match in records])
+                session.commit()
+        except Exception as e:
+            if _is_transient(e):
+                raise
+
+            if len(records) == 1:
+                seq, match = records[0]
+                logging.exception(f"Failed to write spooled match {match}, moving it to the dead letter table.")
+                self.spool.dead_letter(seq, repr(e))
+                return
+
+            logging.warning(f"Failed to write {len(records)} spooled match(es): {e}. Retrying them one by one.")
+        else:
+            self.spool.remove(records[-1][0])
+            logging.info(f"Flushed {len(records)} match(es) to the database.")
+            return
+
+        for record in records:
+            self._flush([record])
+
+    def _run(self):
+        num_failures = 0
+        while True:
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+
+            while records := self.spool.peek(self.batch_size):
+                try:
+                    self._flush(records)
+                except Exception as e:
+                    num_failures += 1
+                    wait_time = min(2 ** num_failures, self.max_backoff)
+                    if _is_transient(e):
+                        logging.warning(f"Failed to flush {len(self.spool)} spooled match(es): {e}. "
+                                        f"Retrying in {wait_time} seconds...")
+                    else:
+                        logging.exception(f"Unexpected error while flushing spooled matches. "
+                                          f"Retrying in {wait_time} seconds...")
+                    time.sleep(wait_time)
+                    break
+
+                num_failures = 0
+
+
+def _is_transient(e):
+    """
+    Whether a database error is worth retrying as is: the database is unreachable or the connection dropped.
+    """
+    return isinstance(e, (OperationalError, InterfaceError)) \
+        or (isinstance(e, DBAPIError) and e.connection_invalidated)
+
+
+# Columns and indexes added to tables created before the models had them, see `migrate`
+MIGRATED_COLUMNS = {
+    "spool_id": "VARCHAR",
+    "red_id": "INTEGER",
+    "blue_id": "INTEGER",
+    "winner_code": "SMALLINT",
+}
+MIGRATED_INDEXES = {
+    "ix_matches_spool_id": "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_matches_spool_id ON matches (spool_id)",
+    # Integer keys for the joins of the training and simulation queries
+    "ix_matches_red_id": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_matches_red_id ON matches (red_id)",
+    "ix_matches_blue_id": "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_matches_blue_id ON matches (blue_id)",
+    "ix_match_metadata_match_id":
+        "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_match_metadata_match_id ON match_metadata (match_id)",
+}
+
+
+def missing_columns(engine):
+    """
+    Columns of `MIGRATED_COLUMNS` the matches table doesn't have yet. Only reads the catalog, takes no lock.
+    """
+    existing = {column["name"] for column in sqlalchemy.inspect(engine).get_columns("matches")}
+    return [name for name in MIGRATED_COLUMNS if name not in existing]
 
-                if commit:
-                    session.commit()
 
-                logging.info(f"Added match successfully.")
-                return  # No error, so return
+def migrate(engine):
+    """
+    Bring an existing database up to date with the models, `create_all` only creates missing tables.
 
-        except OperationalError as e:
-            if i == num_retries - 1:
-                # Final retry, raise the exception
-                raise e
+    Run by ``model_dev/migrate_database.py``, never on startup: adding a column locks the matches table. Only the
+    missing columns are added, and the indexes are built concurrently so writes go on meanwhile.
+    """
+    columns = missing_columns(engine)
+    if columns:
+        with engine.begin() as connection:
+            for name in columns:
+                logging.info(f"Adding matches.{name}")
+                connection.execute(text(f"ALTER TABLE matches ADD COLUMN IF NOT EXISTS {name} {MIGRATED_COLUMNS[name]}"))
+
+    # CREATE INDEX CONCURRENTLY can't run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        # An interrupted concurrent build leaves an invalid index behind, which IF NOT EXISTS would keep
+        invalid = connection.execute(text("""
+            SELECT c.relname FROM pg_index AS i JOIN pg_class AS c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = ANY(:names)
+        """), {"names": list(MIGRATED_INDEXES)}).scalars().all()
+        for name in invalid:
+            logging.info(f"Dropping invalid index {name}")
+            connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+        for name, statement in MIGRATED_INDEXES.items():
+            logging.info(f"Creating index {name} if missing")
+            connection.execute(text(statement))
+
+
+def backfill(engine, batch_size=50000):
+    """
+    Fill in `Match.red_id`, `Match.blue_id` and `Match.winner_code` for matches written before they existed.
 
-            # Otherwise, retry after a short wait
-            wait_time = 2 ** (i - 1)
-            logging.warning(f"OperationalError: {e}. Retrying in {wait_time} seconds...")
-            time.sleep(wait_time)
+    Works through the matches table in id ranges of `batch_size`, committing each range, so it can be interrupted
+    and resumed.
+
+    Returns
+    -------
+    int
+        Number of matches updated.
+    """
+    with Session(engine) as session:
+        min_id, max_id = session.execute(
+            select(func.min(Match.id), func.max(Match.id)).where(Match.red_id.is_(None))
+        ).one()
+
+    if min_id is None:
+        return 0
+
+    num_updated = 0
+    for start in range(min_id, max_id + 1, batch_size):
+        with engine.begin() as connection:
+            result = connection.execute(text("""
+                UPDATE matches AS m
+                SET red_id = r.id,
+                    blue_id = b.id,
+                    winner_code = CASE m.winner WHEN 'red' THEN 0 WHEN 'blue' THEN 1 END
+                FROM characters AS r, characters AS b
+                WHERE m.red = r.name
+                  AND m.blue = b.name
+                  AND m.id >= :start
+                  AND m.id < :stop
+                  AND m.red_id IS NULL
+            """), {"start": start, "stop": start + batch_size})
+
+        num_updated += result.rowcount
+        logging.info(f"Backfilled {num_updated} match(es), up to id {min(start + batch_size, max_id + 1)}")
+
+    return num_updated
+
+
+@lazy_singleton(budget=5)
+def get_engine():
+    """
+    The engine for ``settings.PG_DSN``, created on first use along with any missing tables.
+
+    Tables from before the current models must be migrated first with ``model_dev/migrate_database.py``.
+    """
+    if settings.PG_DSN is None:
+        raise ValueError("No database specified, set PG_DSN.")
+
+    engine = sqlalchemy.create_engine(settings.PG_DSN, echo=False)
+    Base.metadata.create_all(engine)
 
+    columns = missing_columns(engine)
+    if columns:
+        raise RuntimeError(f"The matches table has no {', '.join(columns)} column(s), "
+                           f"run model_dev/migrate_database.py first.")
 
-engine = sqlalchemy.create_engine(settings.PG_DSN, echo=False)
-Base.metadata.create_all(engine)
+    return engine
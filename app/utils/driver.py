@@ -1,6 +1,8 @@
 import logging
 import re
+import threading
 import time
+from dataclasses import dataclass
 from math import floor
 
 from selenium import webdriver
@@ -14,8 +16,243 @@ from selenium.webdriver.firefox.options import Options
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import WebDriverWait
 
+from app.utils.lazy import lazy_singleton
 from app.utils.settings import settings
 
+# Elements pushed by the observer, as {field: (element to observe, element to read)}
+OBSERVED_ELEMENTS = {
+    "betstatus": ("#betstatus", "#betstatus"),
+    "sbettors1": ("#sbettors1", "#sbettors1 .redtext"),
+    "sbettors2": ("#sbettors2", "#sbettors2 .bluetext"),
+    "odds": ("#odds", "#odds"),
+    "lastbet": ("#lastbet", "#lastbet"),
+    "balance": ("#balance", "#balance"),
+}
+
+# Installs a MutationObserver on every observed element that queues [field, text] pairs on change
+OBSERVER_SCRIPT = """
+if (window.saltyObserver) {
+    window.saltyObserver.disconnect();
+}
+const observer = {queue: [], waiter: null, observers: []};
+const read = (field, selector) => {
+    const element = document.querySelector(selector);
+    observer.queue.push([field, element ? element.innerText : ""]);
+    if (field === "balance") {
+        observer.queue.push(["balance_class", element ? element.className : ""]);
+    }
+    if (observer.waiter) {
+        observer.waiter();
+    }
+};
+for (const [field, [root, selector]] of Object.entries(arguments[0])) {
+    const element = document.querySelector(root);
+    if (!element) {
+        continue;
+    }
+    const mutationObserver = new MutationObserver(() => read(field, selector));
+    mutationObserver.observe(element, {childList: true, subtree: true, characterData: true, attributes: true});
+    observer.observers.push(mutationObserver);
+    read(field, selector);
+}
+observer.disconnect = () => observer.observers.forEach(o => o.disconnect());
+window.saltyObserver = observer;
+"""
+
+# Long-polls the observer queue, resolves as soon as there are changes or after the timeout (ms) in arguments[0]
+POLL_SCRIPT = """
+const done = arguments[arguments.length - 1];
+const observer = window.saltyObserver;
+if (!observer) {
+    done(null);  // The page was reloaded
+    return;
+}
+const drain = () => {
+    observer.waiter = null;
+    done(observer.queue.splice(0));
+};
+if (observer.queue.length) {
+    drain();
+    return;
+}
+const timer = setTimeout(drain, arguments[0]);
+observer.waiter = () => {
+    clearTimeout(timer);
+    drain();
+};
+"""
+
+# Reads every observed element in a single round trip
+SNAPSHOT_SCRIPT = """
+const fields = {};
+for (const [field, [root, selector]] of Object.entries(arguments[0])) {
+    const element = document.querySelector(selector);
+    fields[field] = element ? element.innerText : "";
+}
+const balance = document.querySelector("#balance");
+fields.balance_class = balance ? balance.className : "";
+return fields;
+"""
+
+
+def parse_winner(status_text):
+    """
+    Parses the winning team, either "red" or "blue", from the bet status text. None if there was a tie.
+    """
+    status_text = status_text.lower()
+
+    if "red" in status_text:
+        return "red"
+
+    if "blue" in status_text:
+        return "blue"
+
+    return None  # Tie or unknown
+
+
+def parse_odds(betting_text, warn=True):
+    """
+    Parses the (red, blue) odds from the last bet text. (0.0, 0.0) if they cannot be parsed, logged if `warn`.
+    """
+    # Find all numbers inbetween the ":" i.e. the odds
+    odds = re.findall(r"(?<!\$)\b\d+(?:\.\d+)?\b(?![^:]*\d)", betting_text)
+
+    if len(odds) != 2:
+        if warn:
+            logging.warning(f"Failed to parse odds from {betting_text}")
+        return 0.0, 0.0
+
+    red, blue = [float(x) for x in odds]
+    return red, blue
+
+
+def parse_pots(text, warn=True):
+    """
+    Parses the (red, blue) pot amounts from the odds text. (0, 0) if they cannot be parsed, logged if `warn`.
+    """
+    amounts = re.findall(r"\$(\d[\d,]*)", text)
+
+    if len(amounts) != 2:
+        if warn:
+            logging.warning(f"Could not parse pots from text: {text}")
+        return 0, 0
+
+    red_pot, blue_pot = [int(amount.replace(",", "")) for amount in amounts]
+
+    return red_pot, blue_pot
+
+
+def parse_balance(text):
+    """
+    Parses the balance from the balance text. 0 if it is empty.
+    """
+    text = text.replace(",", "").strip()
+    return int(text) if text else 0
+
+
+def parse_match_up(red_text, blue_text):
+    """
+    Parses the (red, blue) team names from the bettor headers.
+    """
+    red, blue = red_text.strip(), blue_text.strip()
+
+    # The headers read "<bettors> | <red>" and "<blue> | <bettors>", split once so names may contain "|"
+    if "|" in red:
+        red = red.split("|", 1)[1].strip()
+    if "|" in blue:
+        blue = blue.rsplit("|", 1)[0].strip()
+
+    return red, blue
+
+
+def has_required(fields, require):
+    """
+    Whether the raw text of the observed elements has every required field.
+
+    A field of `OBSERVED_ELEMENTS` is there when its element has text, ``"winner"`` when the bet status names one.
+    """
+    for field in require:
+        if field == "winner":
+            if parse_winner(fields.get("betstatus", "")) is None:
+                return False
+        elif not fields.get(field, "").strip():
+            return False
+
+    return True
+
+
+@dataclass(frozen=True, slots=True)
+class PageSnapshot:
+    """
+    Every field of the page we care about, read at a single point in time.
+
+    Attributes
+    ----------
+    status : str
+        The bet status text, lower case.
+    red : str
+        Name of the red team.
+    blue : str
+        Name of the blue team.
+    red_pot : int
+        Amount of money in the red pot.
+    blue_pot : int
+        Amount of money in the blue pot.
+    red_odds : float
+        Betting odds of the red team.
+    blue_odds : float
+        Betting odds of the blue team.
+    balance : int
+        Current balance.
+    is_tournament : bool
+        Whether the balance is the tournament balance.
+    """
+    status: str
+    red: str
+    blue: str
+    red_pot: int
+    blue_pot: int
+    red_odds: float
+    blue_odds: float
+    balance: int
+    is_tournament: bool
+
+    @classmethod
+    def from_fields(cls, fields, require=()):
+        """
+        Parses a snapshot from the raw text of the observed elements.
+
+        Only the `require`d fields (see `SaltyBetDriver.snapshot`) are expected to be there, a missing one is logged.
+        Any other field may legitimately be empty in the current state and silently falls back to its default.
+        """
+        red, blue = parse_match_up(fields.get("sbettors1", ""), fields.get("sbettors2", ""))
+        red_pot, blue_pot = parse_pots(fields.get("odds", ""), warn="odds" in require)
+        red_odds, blue_odds = parse_odds(fields.get("lastbet", ""), warn="lastbet" in require)
+
+        if "balance" in require and not fields.get("balance", "").strip():
+            logging.warning("Failed to read the balance")
+        if "winner" in require and parse_winner(fields.get("betstatus", "")) is None:
+            logging.warning(f"Failed to parse the winner from {fields.get('betstatus', '')}")
+
+        return cls(
+            status=fields.get("betstatus", "").strip().lower(),
+            red=red,
+            blue=blue,
+            red_pot=red_pot,
+            blue_pot=blue_pot,
+            red_odds=red_odds,
+            blue_odds=blue_odds,
+            balance=parse_balance(fields.get("balance", "")),
+            is_tournament="purple" in fields.get("balance_class", "").lower(),
+        )
+
+    @property
+    def winner(self):
+        """
+        The winning team of the last match, either "red" or "blue". None if there was a tie.
+        """
+        return parse_winner(self.status)
+
 
 class SaltyBetDriver:
     VALID_TEAMS = {"red", "blue"}
@@ -30,10 +267,16 @@ class SaltyBetDriver:
         ------
         RuntimeError
             If the driver fails to load the website.
+            If the credentials are not set.
             If the driver fails to log in.
         """
         logging.info("Initializing driver")
 
+        # Credentials are only needed once we actually log in
+        if not settings.SALTYBET_USERNAME or not settings.SALTYBET_PASSWORD:
+            logging.error("SALTYBET_USERNAME and SALTYBET_PASSWORD must be set to log in")
+            raise RuntimeError
+
         self.sleep_time = 0.5
 
         self.last_balance = 0
@@ -42,6 +285,12 @@ class SaltyBetDriver:
         self.winnings = 0
         self.winnings_tournament = 0
 
+        # Serializes WebDriver commands between the observer thread and the callers
+        self._lock = threading.RLock()
+        self.observing = False
+        self._fields = {}
+        self._fields_changed = threading.Condition()
+
         options = Options()
         options.add_argument("--headless")
 
@@ -49,7 +298,7 @@ class SaltyBetDriver:
         self.wait = WebDriverWait(self.driver, settings.WAIT_TIME)
 
         # Load into the website
-        self.driver.get("https://www.saltybet.com/authenticate?signin=1")
+        self.driver.get(f"{settings.SALTYBET_URL.rstrip('/')}/authenticate?signin=1")
         try:
             self.wait.until(EC.title_contains("Salty Bet"))
         except TimeoutException:
@@ -73,6 +322,9 @@ class SaltyBetDriver:
             logging.error("Failed to login. Wrong username or password?")
             raise RuntimeError
 
+        if settings.USE_DOM_OBSERVER:
+            self.start_observer()
+
         logging.info("Driver initialized")
 
     def __del__(self):
@@ -82,6 +334,7 @@ class SaltyBetDriver:
         This will close the browser window.
         """
         logging.info("Closing driver")
+        self.observing = False
         try:
             self.driver.quit()
         except WebDriverException:
@@ -89,6 +342,123 @@ class SaltyBetDriver:
         
         logging.info("Driver closed")
 
+    def start_observer(self):
+        """
+        Inject the MutationObserver and start pushing page changes into the field cache.
+
+        Once started, the getters read from the cache instead of polling the page.
+        """
+        self.driver.set_script_timeout(settings.OBSERVER_POLL_TIMEOUT + settings.WAIT_TIME)
+        self._install_observer()
+
+        self.observing = True
+        threading.Thread(target=self._observe, daemon=True).start()
+        logging.info("DOM observer started")
+
+    def _install_observer(self):
+        with self._lock:
+            self.wait.until(EC.presence_of_element_located((By.ID, "betstatus")))
+            self.driver.execute_script(OBSERVER_SCRIPT, OBSERVED_ELEMENTS)
+
+    def _stop_observing(self):
+        """
+        Stop reading from the field cache, waking every waiter so it falls back to polling the page.
+        """
+        with self._fields_changed:
+            self.observing = False
+            self._fields_changed.notify_all()
+
+    def _observe(self):
+        """
+        Long-poll the observer queue and apply the changes to the field cache.
+
+        Falls back to polling the page if the observer can't keep going.
+        """
+        try:
+            self._poll_observer()
+        except Exception:
+            logging.exception("The DOM observer failed, polling the page instead")
+            self._stop_observing()
+
+    def _poll_observer(self):
+        timeout_ms = int(settings.OBSERVER_POLL_TIMEOUT * 1000)
+
+        while self.observing:
+            try:
+                with self._lock:
+                    events = self.driver.execute_async_script(POLL_SCRIPT, timeout_ms)
+            except TimeoutException:
+                continue
+            except WebDriverException as e:
+                if not self.observing:
+                    return
+                logging.warning(f"Observer poll failed: {e}")
+                time.sleep(self.sleep_time)
+                continue
+
+            if events is None:
+                # The page was reloaded, observe the new document
+                logging.info("Reinstalling DOM observer")
+                try:
+                    self._install_observer()
+                except WebDriverException as e:
+                    logging.error(f"Failed to reinstall the DOM observer, polling the page instead: {e}")
+                    self._stop_observing()
+                    return
+                continue
+
+            if events:
+                with self._fields_changed:
+                    self._fields.update(events)
+                    self._fields_changed.notify_all()
+
+            # Give waiting callers a chance to take the lock
+            time.sleep(0.001)
+
+    def _wait_for_field(self, field, predicate=bool, timeout=settings.WAIT_TIME):
+        """
+        Blocks until the stripped text of an observed field satisfies `predicate`, by default until it has text.
+
+        The predicate gets None while the field has never been observed.
+
+        Returns
+        -------
+        text : str or None
+            The stripped text of the field. None on timeout or when the observer stopped.
+        """
+
+        def ready():
+            text = self._fields.get(field)
+            return predicate(None if text is None else text.strip())
+
+        with self._fields_changed:
+            self._fields_changed.wait_for(lambda: not self.observing or ready(), timeout=timeout)
+            if not self.observing or not ready():
+                return None
+            return self._fields[field].strip()
+
+    def wait_for_bet_status(self, last=None, timeout=settings.WAIT_TIME):
+        """
+        Blocks until the bet status differs from `last`. Requires the observer.
+
+        Parameters
+        ----------
+        last : str, default=None
+            The last bet status seen by the caller.
+        timeout : float, default=settings.WAIT_TIME
+            Seconds to wait before giving up.
+
+        Returns
+        -------
+        state : str or None
+            The new state of the game. None on timeout or when the observer stopped.
+        """
+        def changed(text):
+            return bool(text) and (last is None or text.lower() != last.lower())
+
+        text = self._wait_for_field("betstatus", predicate=changed, timeout=timeout)
+        return text.lower() if text is not None else None
+
     def _get_element_text(self, element_id):
         """
         Retrieves the text of an element by its ID. If the text is invalid, the function blocks until the text is valid.
@@ -108,6 +478,12 @@ class SaltyBetDriver:
         The text is invalid if it is empty or contains only whitespace.
         This function blocks until the text is valid.
         """
+        if self.observing:
+            text = self._wait_for_field(element_id)
+            if text is not None:
+                return text
+            # Observer stopped or the field never showed up, read the page
+
         try:
             element = self.wait.until(EC.presence_of_element_located((By.ID, element_id)))
             text = ""
@@ -135,15 +511,7 @@ class SaltyBetDriver:
             The winning team. None if there was a tie.
         """
 
-        payout_message = self._get_element_text("betstatus").lower()
-
-        if "red" in payout_message:
-            return "red"
-
-        if "blue" in payout_message:
-            return "blue"
-
-        return None  # Tie or unknown
+        return parse_winner(self._get_element_text("betstatus"))
 
     def get_bet_status(self):
         """
@@ -166,6 +534,11 @@ class SaltyBetDriver:
             Amount to bet.
         team : str
             Team to bet on. Must be one of ``['red', 'blue']``.
+
+        Returns
+        -------
+        bool
+            Whether the bet was placed, always True once the bet button was clicked.
         """
 
         if team not in self.VALID_TEAMS:
@@ -177,15 +550,18 @@ class SaltyBetDriver:
         if not isinstance(amount, int):
             amount = floor(amount)
 
-        wager = self.wait.until(EC.element_to_be_clickable((By.ID, "wager")))
-        wager.clear()
-        wager.send_keys(str(amount))
+        with self._lock:
+            wager = self.wait.until(EC.element_to_be_clickable((By.ID, "wager")))
+            wager.clear()
+            wager.send_keys(str(amount))
 
-        button_class = f'betbutton{team}'
-        bet_button = self.wait.until(
-            EC.element_to_be_clickable((By.CLASS_NAME, button_class))
-        )
-        bet_button.click()
+            button_class = f'betbutton{team}'
+            bet_button = self.wait.until(
+                EC.element_to_be_clickable((By.CLASS_NAME, button_class))
+            )
+            bet_button.click()
+
+        return True
 
     def get_odds(self):
         """
@@ -196,17 +572,7 @@ class SaltyBetDriver:
         (float, float)
             Betting odds of the current match.
         """
-        betting_text = self._get_element_text("lastbet")
-
-        # Find all numbers inbetween the ":" i.e. the odds
-        odds = re.findall(r"(?<!\$)\b\d+(?:\.\d+)?\b(?![^:]*\d)", betting_text)
-
-        if len(odds) != 2:
-            logging.warning(f"Failed to parse odds from {betting_text}")
-            return 0.0, 0.0
-
-        red, blue = [float(x) for x in odds]
-        return red, blue
+        return parse_odds(self._get_element_text("lastbet"))
 
     def get_match_up(self):
         """
@@ -217,6 +583,11 @@ class SaltyBetDriver:
         (str, str) or None
             Names of the red and blue teams.
         """
+        if self.observing:
+            red, blue = self._wait_for_field("sbettors1"), self._wait_for_field("sbettors2")
+            if red is not None and blue is not None:
+                return parse_match_up(red, blue)
+
         try:
             red_element = self.wait.until(EC.presence_of_element_located((By.ID, "sbettors1")))
             red_element = red_element.find_element(By.CLASS_NAME, "redtext")
@@ -226,13 +597,7 @@ class SaltyBetDriver:
             blue = ''
 
             while not red.strip() or not blue.strip():
-                red = red_element.text
-                blue = blue_element.text
-
-                if "|" in red or "|" in blue:
-                    red = red.split("|")[1].strip()
-                    blue = blue.split("|")[0].strip()
-
+                red, blue = parse_match_up(red_element.text, blue_element.text)
                 time.sleep(self.sleep_time)
 
             return red, blue
@@ -253,27 +618,35 @@ class SaltyBetDriver:
         balance : int
             Current balance.
         """
-        balance_text = self._get_element_text("balance")
-
-        balance = int(balance_text.replace(",", ""))
+        balance = parse_balance(self._get_element_text("balance"))
 
         if self.last_balance == 0:
             self.last_balance = balance
 
         return balance
 
-    def get_payout(self):
+    def get_payout(self, snapshot=None):
         """
         Gets the payout for the current match.
 
+        Parameters
+        ----------
+        snapshot : PageSnapshot, default=None
+            Snapshot to read the balance from instead of querying the page.
+
         Returns
         -------
         payout : int
             The payout for the last match.
         """
-        balance = self.get_balance()
-
-        if self.is_tournament():
+        if snapshot is not None:
+            balance, is_tournament = snapshot.balance, snapshot.is_tournament
+            if self.last_balance == 0:
+                self.last_balance = balance
+        else:
+            balance, is_tournament = self.get_balance(), self.is_tournament()
+
+        if is_tournament:
             payout = balance - self.last_balance_tournament
             self.last_balance_tournament = balance
             return payout
@@ -293,26 +666,68 @@ class SaltyBetDriver:
         (int, int)
             Amounts of the red and blue pots.
         """
-        text = self._get_element_text("odds")
+        return parse_pots(self._get_element_text("odds"))
 
-        amounts = re.findall(r"\$(\d[\d,]*)", text)
+    def snapshot(self, require=()):
+        """
+        Reads every field we care about in a single round trip.
 
-        if len(amounts) != 2:
-            logging.warning(f"Could not parse pots from text: {text}")
-            return 0, 0
+        Parameters
+        ----------
+        require : tuple[str], default=()
+            Elements (see `OBSERVED_ELEMENTS`) that must have text before the snapshot is taken, e.g. ``("odds",)``
+            right after bets lock, or ``"winner"`` for a bet status naming the winner.
+            Gives up after ``settings.WAIT_TIME`` seconds.
+
+        Returns
+        -------
+        PageSnapshot
+            The parsed state of the page.
+        """
+        if self.observing:
+            # The observer already holds the latest text, no round trip needed
+            with self._fields_changed:
+                self._fields_changed.wait_for(
+                    lambda: not self.observing or has_required(self._fields, require), timeout=settings.WAIT_TIME
+                )
+                if self.observing:
+                    return PageSnapshot.from_fields(dict(self._fields), require)
+
+        deadline = time.time() + settings.WAIT_TIME
+        while True:
+            with self._lock:
+                fields = self.driver.execute_script(SNAPSHOT_SCRIPT, OBSERVED_ELEMENTS)
 
-        red_pot, blue_pot = [int(amount.replace(",", "")) for amount in amounts]
+            if has_required(fields, require) or time.time() > deadline:
+                return PageSnapshot.from_fields(fields, require)
 
-        return red_pot, blue_pot
+            time.sleep(self.sleep_time)
 
     def is_tournament(self):
+        if self.observing:
+            # The class may be empty, any observed value will do
+            balance_class = self._wait_for_field("balance_class", predicate=lambda text: text is not None)
+            if balance_class is not None:
+                return "purple" in balance_class.lower()
+
         balance = self.wait.until(EC.presence_of_element_located((By.ID, "balance")))
         return "purple" in balance.get_attribute("class").lower()
 
 
-driver = SaltyBetDriver()
+@lazy_singleton(budget=30)
+def get_driver():
+    """
+    The driver for the backend selected by ``settings.DRIVER_BACKEND``, created and logged in on first use.
+    """
+    if settings.DRIVER_BACKEND == "http":
+        from app.utils.http_driver import SaltyBetHTTPDriver
+        return SaltyBetHTTPDriver()
+
+    return SaltyBetDriver()
+
 
 if __name__ == '__main__':
+    driver = get_driver()
     for i in range(1000):
         print(driver.get_match_up())
         time.sleep(1)
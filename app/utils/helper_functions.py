@@ -1,21 +1,136 @@
 import json
 import logging
-import os
 import random
 import re
+from functools import lru_cache
 
 import numpy as np
-import onnxruntime as ort
 
+from app.utils.inference import Predictor, create_session
+from app.utils.lazy import lazy_singleton
+from app.utils.name_index import NameIndex
 from app.utils.settings import settings
+from app.utils.vocab import load_vocab
 
-# Load the model
-if settings.MODEL_DIR:
-    model = ort.InferenceSession(os.path.join(settings.MODEL_DIR, 'model.onnx'))
-    with open(os.path.join(settings.MODEL_DIR, 'vocab.json')) as f:
-        characters = json.load(f)
-else:
-    raise ValueError("No model directory specified.")
+model = None
+characters = None
+name_index = None
+model_dir = None
+
+# Predictions made only thanks to the name index
+num_rescued_bets = 0
+
+# Fallback for match ups with a character the model doesn't know, see `set_win_rates`
+win_rates = None
+
+
+def read_model(path):
+    """
+    Load a model, its vocab and name index and warm the model up, without using it for predictions yet.
+
+    Parameters
+    ----------
+    path : str
+        Directory holding ``model.onnx`` and ``vocab.bin`` or ``vocab.json``.
+
+    Returns
+    -------
+    tuple[Predictor, Mapping[str, int], NameIndex]
+        The model, vocab and name index, to pass to `install_model`.
+    """
+    # The predictor warms the session up
+    predictor = Predictor(create_session(path))
+    vocab = load_vocab(path)
+    index = NameIndex(vocab)
+
+    return predictor, vocab, index
+
+
+def install_model(path, loaded):
+    """
+    Make a model read by `read_model` the one used for predictions, invalidating the prediction cache.
+
+    Not synchronized with `predict_winner`, call it between predictions.
+    """
+    global model, characters, name_index, model_dir
+
+    model, characters, name_index = loaded
+    model_dir = path
+    _predict_indices.cache_clear()
+
+
+def load_model(path):
+    """
+    Load a model and use it for predictions, see `read_model`.
+    """
+    install_model(path, read_model(path))
+
+
+@lazy_singleton(budget=2)
+def _load_default_model():
+    if model is None:
+        if not settings.MODEL_DIR:
+            raise ValueError("No model directory specified.")
+
+        load_model(settings.MODEL_DIR)
+
+
+def get_model():
+    """
+    The loaded model, loading ``settings.MODEL_DIR`` on first use unless `load_model` already ran.
+
+    Returns
+    -------
+    Predictor
+        The model.
+    """
+    _load_default_model()
+    return model
+
+
+def set_win_rates(table):
+    """
+    Fall back to a win rate table when a character is missing from the vocab.
+
+    Parameters
+    ----------
+    table : app.utils.win_rates.WinRateTable or None
+        The table, ``None`` to go back to random predictions.
+    """
+    global win_rates
+    win_rates = table
+
+
+@lru_cache(maxsize=settings.PREDICTION_CACHE_SIZE)
+def _predict_indices(red_idx, blue_idx):
+    """
+    Run the model on a single match up. Memoized, match ups repeat a lot.
+    """
+    output = model.predict_pair(red_idx, blue_idx)
+
+    # Softmax the output
+    output = np.exp(output) / np.sum(np.exp(output), axis=0)
+
+    # Get the predicted winner
+    pred = np.argmax(output)
+    team = "red" if pred == 0 else "blue"
+
+    # Get the confidence
+    conf = float(output[pred])
+
+    return conf, team
+
+
+def prediction_cache_info():
+    """
+    Hits, misses and size of the prediction cache.
+
+    Returns
+    -------
+    functools._CacheInfo
+        Named tuple of ``(hits, misses, maxsize, currsize)``.
+    """
+    return _predict_indices.cache_info()
 
 
 def predict_winner(red, blue):
@@ -36,37 +151,49 @@ def predict_winner(red, blue):
     team : str
         The predicted winner.
     """
+    global num_rescued_bets
+
+    get_model()
 
-    # Convert the characters to indices
-    try:
-        red_idx = characters[red]
-        blue_idx = characters[blue]
+    # Convert the characters to indices, resolving near misses
+    red_idx = name_index.resolve(red)
+    blue_idx = name_index.resolve(blue)
 
-    except KeyError:
+    if red_idx is None or blue_idx is None:
         # Find out which character is missing
-        if red not in characters:
+        if red_idx is None:
             logging.warning(f"Unknown character: {red}")
 
-        if blue not in characters:
+        if blue_idx is None:
             logging.warning(f"Unknown character: {blue}")
 
-        # If we don't have a character in our vocab, just return a random prediction
+        # If we don't have a character in our vocab, fall back to their win rates
+        if win_rates is not None:
+            return win_rates.predict_winner(red, blue)
+
+        # Or just return a random prediction
         return -1, random.choice(["red", "blue"])
 
-    model_input = np.array([[red_idx, blue_idx]]).astype(np.int64)
-    output = model.run(None, {'input': model_input})[0][0]
+    if red not in characters or blue not in characters:
+        num_rescued_bets += 1
 
-    # Softmax the output
-    output = np.exp(output) / np.sum(np.exp(output), axis=0)
+    return _predict_indices(red_idx, blue_idx)
 
-    # Get the predicted winner
-    pred = np.argmax(output)
-    team = "red" if pred == 0 else "blue"
 
-    # Get the confidence
-    conf = float(output[pred])
+def name_resolution_info():
+    """
+    How the names passed to `predict_winner` were resolved.
 
-    return conf, team
+    Returns
+    -------
+    dict[str, int]
+        Number of names found as-is (``exact``), resolved by the name index (``rescued``) or unknown (``missed``),
+        and the number of predictions that were only possible thanks to the name index (``rescued_bets``).
+    """
+    if name_index is None:
+        return {"exact": 0, "rescued": 0, "missed": 0, "rescued_bets": 0}
+
+    return {**name_index.info(), "rescued_bets": num_rescued_bets}
 
 
 def calculate_bet(balance, confidence, is_tournament):
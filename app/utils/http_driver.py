@@ -0,0 +1,352 @@
+import logging
+import re
+import time
+from math import floor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from app.utils.driver import PageSnapshot, parse_balance
+from app.utils.settings import settings
+
+# state.json status values and the bet status text the page shows for them
+STATUS_TEXT = {
+    "open": "bets are open!",
+    "locked": "bets are locked until the next match.",
+    "1": "payouts to team red.",
+    "2": "payouts to team blue.",
+}
+WINNERS = {"1": "red", "2": "blue"}
+
+
+class SaltyBetHTTPDriver:
+    """
+    Browser-free driver that reads the site's state JSON and places bets with plain HTTP requests.
+
+    Implements the same interface as `SaltyBetDriver`.
+    """
+    VALID_TEAMS = {"red", "blue"}
+    PLAYERS = {"red": "player1", "blue": "player2"}
+
+    # Successive getters within this window share one state request (seconds)
+    STATE_TTL = 0.25
+
+    def __init__(self):
+        """
+        Initialize the driver and log in.
+
+        Raises
+        ------
+        RuntimeError
+            If the site cannot be reached.
+            If the credentials are not set.
+            If the driver fails to log in.
+        """
+        logging.info("Initializing HTTP driver")
+
+        # Credentials are only needed once we actually log in
+        if not settings.SALTYBET_USERNAME or not settings.SALTYBET_PASSWORD:
+            logging.error("SALTYBET_USERNAME and SALTYBET_PASSWORD must be set to log in")
+            raise RuntimeError
+
+        self.sleep_time = 0.5
+        self.observing = False  # Nothing to observe, every read is a single request
+
+        self.last_balance = 0
+        self.last_balance_tournament = 0
+
+        self.base_url = settings.SALTYBET_URL.rstrip("/")
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=4,
+            max_retries=Retry(total=3, backoff_factor=0.1, allowed_methods=["GET"]),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._state = {}
+        self._state_time = 0
+
+        # Login
+        try:
+            response = self.session.post(
+                f"{self.base_url}/authenticate?signin=1",
+                data={
+                    "email": settings.SALTYBET_USERNAME,
+                    "pword": settings.SALTYBET_PASSWORD,
+                    "authenticate": "signin",
+                },
+                timeout=settings.WAIT_TIME,
+            )
+        except requests.RequestException as e:
+            logging.error(f"Failed to reach {self.base_url}: {e}")
+            raise RuntimeError
+
+        if "authenticate" in response.url:
+            logging.error("Failed to login. Wrong username or password?")
+            raise RuntimeError
+
+        # The user id keys our entry in zdata.json
+        match = re.search(r'id="u"\s+value="(\d+)"', response.text)
+        if match is None:
+            logging.error("Failed to find the user id after logging in")
+            raise RuntimeError
+        self.user_id = match.group(1)
+
+        logging.info("HTTP driver initialized")
+
+    def __del__(self):
+        """
+        Close the pooled connections on delete.
+        """
+        logging.info("Closing HTTP driver")
+        self.session.close()
+
+    def _get_json(self, path):
+        response = self.session.get(f"{self.base_url}/{path}", timeout=settings.WAIT_TIME)
+        response.raise_for_status()
+        return response.json()
+
+    def _get_state(self, fresh=False):
+        """
+        Gets state.json, reusing the last response for `STATE_TTL` seconds unless `fresh` is set.
+        """
+        if fresh or time.time() - self._state_time > self.STATE_TTL:
+            try:
+                self._state = self._get_json("state.json")
+                self._state_time = time.time()
+            except (requests.RequestException, ValueError) as e:
+                logging.warning(f"Failed to get state: {e}")
+
+        return self._state
+
+    def _wait_for_state(self, key):
+        """
+        Blocks until `key` of state.json has a value.
+        """
+        state = self._get_state()
+        while not str(state.get(key, "")).strip():
+            time.sleep(self.sleep_time)
+            state = self._get_state(fresh=True)
+
+        return state
+
+    def get_bet_status(self):
+        """
+        Gets the current state of the game.
+
+        Returns
+        -------
+        state : str
+            The current state of the game, worded like the bet status on the page.
+        """
+        status = str(self._wait_for_state("status")["status"])
+        return STATUS_TEXT.get(status, f"payouts: {status}")
+
+    def get_winner(self):
+        """
+        Gets the winning team of the last match, either "red" or "blue".
+
+        Returns
+        -------
+        winner : str or None
+            The winning team. None if there was a tie.
+        """
+        return WINNERS.get(str(self._get_state().get("status")))
+
+    def get_match_up(self):
+        """
+        Gets the names of the red and blue team for the current match.
+
+        Returns
+        -------
+        (str, str)
+            Names of the red and blue teams.
+        """
+        self._wait_for_state("p1name")
+        state = self._wait_for_state("p2name")
+        return state["p1name"].strip(), state["p2name"].strip()
+
+    def get_pots(self):
+        """
+        Gets the amounts of the red and blue pots for the current match.
+
+        Returns
+        -------
+        (int, int)
+            Amounts of the red and blue pots.
+        """
+        state = self._get_state()
+        return parse_balance(str(state.get("p1total", ""))), parse_balance(str(state.get("p2total", "")))
+
+    def get_odds(self):
+        """
+        Get the odds of the current match, computed from the pots like the page does.
+
+        Returns
+        -------
+        (float, float)
+            Betting odds of the current match.
+        """
+        red_pot, blue_pot = self.get_pots()
+        if red_pot == 0 or blue_pot == 0:
+            return 0.0, 0.0
+
+        smallest = min(red_pot, blue_pot)
+        return round(red_pot / smallest, 1), round(blue_pot / smallest, 1)
+
+    def get_balance(self):
+        """
+        Gets the current balance for the logged in account.
+
+        Returns
+        -------
+        balance : int
+            Current balance.
+        """
+        try:
+            user = self._get_json("zdata.json").get(self.user_id, {})
+            balance = parse_balance(str(user.get("b", "")))
+        except (requests.RequestException, ValueError) as e:
+            logging.warning(f"Failed to get balance: {e}")
+            balance = self.last_balance
+
+        if self.last_balance == 0:
+            self.last_balance = balance
+
+        return balance
+
+    def is_tournament(self):
+        remaining = str(self._get_state().get("remaining", "")).lower()
+        return "bracket" in remaining or "final round" in remaining
+
+    def get_payout(self, snapshot=None):
+        """
+        Gets the payout for the current match.
+
+        Parameters
+        ----------
+        snapshot : PageSnapshot, default=None
+            Snapshot to read the balance from instead of querying the site.
+
+        Returns
+        -------
+        payout : int
+            The payout for the last match.
+        """
+        if snapshot is not None:
+            balance, is_tournament = snapshot.balance, snapshot.is_tournament
+            if self.last_balance == 0:
+                self.last_balance = balance
+        else:
+            balance, is_tournament = self.get_balance(), self.is_tournament()
+
+        if is_tournament:
+            payout = balance - self.last_balance_tournament
+            self.last_balance_tournament = balance
+            return payout
+
+        payout = balance - self.last_balance
+        self.last_balance = balance
+        self.last_balance_tournament = 0
+
+        return payout
+
+    def snapshot(self, require=()):
+        """
+        Reads every field we care about with one state and one balance request.
+
+        Parameters
+        ----------
+        require : tuple[str], default=()
+            Same as `SaltyBetDriver.snapshot`. The state JSON is always complete, only ``"balance"`` and
+            ``"winner"`` are waited for. Gives up after ``settings.WAIT_TIME`` seconds.
+
+        Returns
+        -------
+        PageSnapshot
+            The parsed state of the site.
+        """
+        deadline = time.time() + settings.WAIT_TIME
+        while True:
+            snapshot = self._read_snapshot()
+
+            missing = [
+                field for field, present in (("balance", snapshot.balance > 0), ("winner", snapshot.winner is not None))
+                if field in require and not present
+            ]
+            if not missing:
+                return snapshot
+
+            if time.time() > deadline:
+                logging.warning(f"Failed to read {', '.join(missing)}")
+                return snapshot
+
+            time.sleep(self.sleep_time)
+
+    def _read_snapshot(self):
+        state = self._get_state(fresh=True)
+        red_pot, blue_pot = self.get_pots()
+        red_odds, blue_odds = self.get_odds()
+
+        return PageSnapshot(
+            status=STATUS_TEXT.get(str(state.get("status")), ""),
+            red=str(state.get("p1name", "")).strip(),
+            blue=str(state.get("p2name", "")).strip(),
+            red_pot=red_pot,
+            blue_pot=blue_pot,
+            red_odds=red_odds,
+            blue_odds=blue_odds,
+            balance=self.get_balance(),
+            is_tournament=self.is_tournament(),
+        )
+
+    def place_bet(self, amount, team):
+        """
+        Places a bet on a SaltyBet match.
+
+        Parameters
+        ----------
+        amount : int
+            Amount to bet.
+        team : str
+            Team to bet on. Must be one of ``['red', 'blue']``.
+
+        Returns
+        -------
+        bool
+            Whether the site accepted the bet.
+        """
+
+        if team not in self.VALID_TEAMS:
+            raise ValueError(f'Team must be one of {self.VALID_TEAMS}')
+
+        if amount <= 0:
+            raise ValueError('Amount must be greater than 0')
+
+        if not isinstance(amount, int):
+            amount = floor(amount)
+
+        response = self.session.post(
+            f"{self.base_url}/ajax_place_bet.php",
+            data={"selectedplayer": self.PLAYERS[team], "wager": str(amount)},
+            timeout=settings.WAIT_TIME,
+        )
+        response.raise_for_status()
+
+        # A rejected wager (bets closed, balance too low) still answers 200, only "1" means it was taken
+        if response.text.strip() == "1":
+            return True
+
+        # Otherwise trust our entry in zdata.json, it holds the player and wager of the current bet
+        try:
+            user = self._get_json("zdata.json").get(self.user_id, {})
+        except ValueError:
+            user = {}
+        if str(user.get("p")) == self.PLAYERS[team][-1] and str(user.get("w")) == str(amount):
+            return True
+
+        logging.warning(f"Bet of {amount} on {team} was rejected: {response.text.strip()!r}")
+        return False
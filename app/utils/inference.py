@@ -0,0 +1,148 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from app.utils.settings import settings
+
+MODEL_FILE = "model.onnx"
+OPTIMIZED_FILE = "model.opt.onnx"
+
+OUTPUT_DTYPES = {
+    "tensor(float)": np.float32,
+    "tensor(float16)": np.float16,
+    "tensor(double)": np.float64,
+}
+
+
+def create_session(
+        model_dir,
+        intra_op_threads=settings.INFERENCE_INTRA_OP_THREADS,
+        inter_op_threads=settings.INFERENCE_INTER_OP_THREADS,
+        optimization=settings.INFERENCE_OPTIMIZATION,
+        save_optimized=settings.INFERENCE_SAVE_OPTIMIZED,
+):
+    """
+    Create a tuned ONNX Runtime session for a model.
+
+    The first session of a model saves the optimized graph next to it, later sessions load that graph and skip the
+    optimizations. The optimized graph may be specific to the machine, it is not meant to be copied around.
+
+    Parameters
+    ----------
+    model_dir : str
+        Directory holding ``model.onnx``.
+    intra_op_threads : int, default=settings.INFERENCE_INTRA_OP_THREADS
+        Threads used inside an operator, 0 for one per core.
+    inter_op_threads : int, default=settings.INFERENCE_INTER_OP_THREADS
+        Threads used to run operators in parallel, 0 for one per core.
+    optimization : str, default=settings.INFERENCE_OPTIMIZATION
+        Graph optimization level, one of "disable", "basic", "extended" or "all".
+    save_optimized : bool, default=settings.INFERENCE_SAVE_OPTIMIZED
+        Save the optimized graph as ``model.opt.onnx`` and load it when it is newer than ``model.onnx``.
+
+    Returns
+    -------
+    onnxruntime.InferenceSession
+        The session.
+    """
+    # Imported here, onnxruntime is slow to import
+    import onnxruntime as ort
+
+    levels = {
+        "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+
+    model_path = os.path.join(model_dir, MODEL_FILE)
+    optimized_path = os.path.join(model_dir, OPTIMIZED_FILE)
+    if save_optimized and os.path.isfile(optimized_path) \
+            and os.path.getmtime(optimized_path) >= os.path.getmtime(model_path):
+        # Already optimized
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        model_path = optimized_path
+    else:
+        options.graph_optimization_level = levels[optimization]
+        if save_optimized and os.access(model_dir, os.W_OK):
+            options.optimized_model_filepath = optimized_path
+
+    start = time.perf_counter()
+    session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+    logging.info(f"Loaded {model_path} in {time.perf_counter() - start:.3f}s")
+
+    return session
+
+
+class Predictor:
+    """
+    Runs single match ups through a session with preallocated, pre-bound input and output buffers.
+
+    Binding the buffers once saves allocating and converting arrays on every call, which dominates the latency of
+    such a small model.
+
+    Parameters
+    ----------
+    session : onnxruntime.InferenceSession
+        Session of a model taking ``(batch, 2)`` character ids and returning ``(batch, 2)`` logits.
+    num_warm_up : int, default=10
+        Number of runs made on creation, the first runs of a session are much slower than the next ones.
+    """
+
+    def __init__(self, session, num_warm_up=10):
+        import onnxruntime as ort
+
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.output_name = session.get_outputs()[0].name
+        self.output_dtype = OUTPUT_DTYPES[session.get_outputs()[0].type]
+
+        self._lock = threading.Lock()
+        self._input = np.zeros((1, 2), dtype=np.int64)
+        self._output = np.zeros((1, 2), dtype=self.output_dtype)
+        self._binding = session.io_binding()
+        self._binding.bind_ortvalue_input(self.input_name, ort.OrtValue.ortvalue_from_numpy(self._input))
+        self._binding.bind_ortvalue_output(self.output_name, ort.OrtValue.ortvalue_from_numpy(self._output))
+
+        for _ in range(num_warm_up):
+            self.predict_pair(0, 0)
+
+    def predict_pair(self, red_idx, blue_idx):
+        """
+        Logits of a single match up.
+
+        Returns
+        -------
+        np.ndarray
+            The red and blue logits, as float64.
+        """
+        with self._lock:
+            self._input[0, 0] = red_idx
+            self._input[0, 1] = blue_idx
+            self.session.run_with_iobinding(self._binding)
+            return self._output[0].astype(np.float64)
+
+    def predict(self, pairs):
+        """
+        Logits of a batch of match ups.
+
+        Parameters
+        ----------
+        pairs : np.ndarray
+            ``(batch, 2)`` red and blue character ids.
+
+        Returns
+        -------
+        np.ndarray
+            ``(batch, 2)`` red and blue logits.
+        """
+        pairs = np.ascontiguousarray(pairs, dtype=np.int64)
+        return self.session.run([self.output_name], {self.input_name: pairs})[0]
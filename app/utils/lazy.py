@@ -0,0 +1,61 @@
+import functools
+import logging
+import threading
+import time
+
+
+def lazy_singleton(budget=None):
+    """
+    Turn a factory into a getter that creates its object on first use and returns the same object afterwards.
+
+    Creation is thread-safe and timed, a warning is logged when it takes longer than `budget`.
+
+    Parameters
+    ----------
+    budget : float, default=None
+        Expected cold-start time (seconds), ``None`` to never warn.
+
+    Examples
+    --------
+    >>> @lazy_singleton(budget=5)
+    ... def get_engine():
+    ...     return sqlalchemy.create_engine(settings.PG_DSN)
+    """
+    def decorator(factory):
+        lock = threading.Lock()
+        instance = []
+
+        @functools.wraps(factory)
+        def get():
+            if not instance:
+                with lock:
+                    if not instance:
+                        start = time.perf_counter()
+                        instance.append(factory())
+                        elapsed = time.perf_counter() - start
+
+                        logging.info(f"{factory.__name__} cold start took {elapsed:.3f}s")
+                        if budget is not None and elapsed > budget:
+                            logging.warning(f"{factory.__name__} cold start took {elapsed:.3f}s, "
+                                            f"over its {budget}s budget")
+
+            return instance[0]
+
+        def is_initialized():
+            """
+            Whether the object has been created, without creating it.
+            """
+            return bool(instance)
+
+        def reset():
+            """
+            Forget the object, the next call creates a new one.
+            """
+            with lock:
+                instance.clear()
+
+        get.is_initialized = is_initialized
+        get.reset = reset
+        return get
+
+    return decorator
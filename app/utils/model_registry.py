@@ -0,0 +1,180 @@
+"""
+Watches the models directory and swaps newly trained models in without restarting the bot.
+
+Every directory under the models directory holding a ``model.onnx`` is a version, named after the directory.
+The newest version is used unless an ``ACTIVE`` file in the models directory names another one, which is how a
+deployment is rolled back::
+
+    python -m app.utils.model_registry list
+    python -m app.utils.model_registry pin 2024.01.01-00.00
+    python -m app.utils.model_registry unpin
+"""
+import argparse
+import logging
+import os
+import threading
+
+import app.utils.helper_functions as helper_functions
+from app.utils.settings import settings
+
+ACTIVE_FILE = "ACTIVE"
+
+
+def list_versions(models_dir):
+    """
+    Versions in `models_dir`, oldest first. Hidden directories are skipped, they are still being written.
+    """
+    if not os.path.isdir(models_dir):
+        return []
+
+    return sorted(
+        name for name in os.listdir(models_dir)
+        if not name.startswith(".") and os.path.isfile(os.path.join(models_dir, name, "model.onnx"))
+    )
+
+
+def read_pinned(models_dir):
+    """
+    Version named by the ``ACTIVE`` file, ``None`` if there is none.
+    """
+    try:
+        with open(os.path.join(models_dir, ACTIVE_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_pinned(models_dir, version):
+    """
+    Pin `version`, or follow the newest version again if `version` is ``None``.
+    """
+    file_name = os.path.join(models_dir, ACTIVE_FILE)
+    if version is None:
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        return
+
+    if version not in list_versions(models_dir):
+        raise ValueError(f"Unknown model version: {version}")
+
+    with open(f"{file_name}.tmp", "w") as f:
+        f.write(version)
+    os.replace(f"{file_name}.tmp", file_name)
+
+
+class ModelRegistry:
+    def __init__(self, models_dir=settings.MODELS_DIR, poll_interval=settings.MODEL_POLL_INTERVAL):
+        """
+        Loads and warms up new model versions on a background thread, ready to be swapped in with `swap`.
+
+        Parameters
+        ----------
+        models_dir : str, default=settings.MODELS_DIR
+            Directory of the model versions.
+        poll_interval : float, default=settings.MODEL_POLL_INTERVAL
+            Time between checks for a new version (seconds).
+        """
+        self.models_dir = models_dir
+        self.poll_interval = poll_interval
+
+        # Version in use, assumed to be the one loaded from MODEL_DIR
+        self.version = os.path.basename(os.path.normpath(helper_functions.model_dir or settings.MODEL_DIR or ""))
+
+        self._lock = threading.Lock()
+        self._pending = None
+        self._failed = set()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """
+        Starts the watcher thread.
+        """
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the watcher thread.
+        """
+        self._stop.set()
+
+    def target_version(self):
+        """
+        Version that should be in use, the pinned one or else the newest.
+        """
+        pinned = read_pinned(self.models_dir)
+        if pinned is not None:
+            return pinned
+
+        versions = list_versions(self.models_dir)
+        return versions[-1] if versions else None
+
+    def _run(self):
+        while not self._stop.is_set():
+            target = self.target_version()
+            with self._lock:
+                pending_version = self._pending[0] if self._pending else None
+
+            if target is not None and target not in (self.version, pending_version) and target not in self._failed:
+                path = os.path.join(self.models_dir, target)
+                logging.info(f"Loading model version {target}")
+                try:
+                    loaded = helper_functions.read_model(path)
+                except Exception as e:
+                    # Don't retry a broken version, a fixed one needs a new directory
+                    logging.error(f"Failed to load model version {target}: {e}")
+                    self._failed.add(target)
+                else:
+                    with self._lock:
+                        self._pending = (target, path, loaded)
+                    logging.info(f"Model version {target} is ready")
+
+            self._stop.wait(self.poll_interval)
+
+    def swap(self):
+        """
+        Start predicting with the model loaded in the background, if there is one. Call it between matches.
+
+        Returns
+        -------
+        bool
+            Whether the model was swapped.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, None
+
+        if pending is None:
+            return False
+
+        version, path, loaded = pending
+        if version != self.target_version():
+            # Pinned to another version while this one was loading
+            return False
+
+        helper_functions.install_model(path, loaded)
+        logging.info(f"Swapped model version {self.version} for {version}")
+        self.version = version
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Choose the model version used by the running bot.")
+    parser.add_argument("command", choices=["list", "pin", "unpin"])
+    parser.add_argument("version", nargs="?", help="Version to pin.")
+    parser.add_argument("--models-dir", default=settings.MODELS_DIR)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        pinned = read_pinned(args.models_dir)
+        for version in list_versions(args.models_dir):
+            print(f"{version}{' (pinned)' if version == pinned else ''}")
+    elif args.command == "pin":
+        if args.version is None:
+            parser.error("pin needs a version")
+        write_pinned(args.models_dir, args.version)
+    else:
+        write_pinned(args.models_dir, None)
+
+
+if __name__ == '__main__':
+    main()
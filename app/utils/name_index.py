@@ -0,0 +1,181 @@
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+
+
+def normalize_name(name):
+    """
+    Normalize a character name for lookups: NFKC, case folded, whitespace collapsed.
+    """
+    name = unicodedata.normalize("NFKC", name).casefold()
+    return re.sub(r"\s+", " ", name).strip()
+
+
+def compact_name(key):
+    """
+    A normalized name without spaces and punctuation, so "Mega Man", "Megaman" and "Mega-Man" are the same.
+    """
+    return re.sub(r"[\W_]+", "", key)
+
+
+def tokens(key):
+    """
+    Words of a normalized name.
+    """
+    return re.findall(r"[^\W_]+", key)
+
+
+def deletions(key):
+    """
+    Every string one character shorter than `key`.
+    """
+    return {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+def is_single_edit(a, b):
+    """
+    Whether `a` and `b` are one insertion, deletion, substitution or swap of adjacent characters apart.
+    """
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        i = diffs[0]
+        return diffs == [i, i + 1] and a[i] == b[i + 1] and a[i + 1] == b[i]
+
+    short, long = (a, b) if len(a) < len(b) else (b, a)
+    i = 0
+    while i < len(short) and short[i] == long[i]:
+        i += 1
+    return short[i:] == long[i + 1:]
+
+
+def is_other_character(a, b):
+    """
+    Whether two normalized names that are a single edit apart are more likely different characters than a typo.
+
+    Sequels and variants ("Ryu 2", "Super Mario 64", "Mega Man X", "Sonic EX") differ from the original by a
+    number or a short word, which a typo never adds.
+    """
+    if re.findall(r"\d+", a) != re.findall(r"\d+", b):
+        return True
+
+    a_tokens, b_tokens = tokens(a), tokens(b)
+    if len(a_tokens) != len(b_tokens):
+        # A word added or removed, a typo merging or splitting words is handled by compact_name
+        short, long = sorted((a_tokens, b_tokens), key=len)
+        return any(long[:i] + long[i + 1:] == short for i in range(len(long)))
+
+    return any(x != y and min(len(x), len(y)) <= 2 for x, y in zip(a_tokens, b_tokens))
+
+
+class NameIndex:
+    """
+    Resolves character names that miss the vocab exactly to the character they most likely are.
+
+    Names are first looked up as-is, then normalized (see `normalize_name`), then without spaces and punctuation
+    (see `compact_name`), and finally allowing a single typo. A typo is only accepted when exactly one character is
+    that close and the names don't differ by a number or a short word (see `is_other_character`). Built once per
+    model, lookups take microseconds.
+
+    Parameters
+    ----------
+    vocab : Mapping[str, int]
+        Character name to id.
+    min_typo_length : int, default=5
+        Shortest name, without spaces and punctuation, for which a typo is corrected.
+    """
+
+    def __init__(self, vocab, min_typo_length=5):
+        self.vocab = vocab
+        self.min_typo_length = min_typo_length
+
+        # Keys mapping to several characters are ambiguous and never resolved
+        normalized = defaultdict(set)
+        for name, _id in vocab.items():
+            normalized[normalize_name(name)].add(_id)
+        self.normalized = {key: ids.pop() for key, ids in normalized.items() if len(ids) == 1}
+
+        compact = defaultdict(set)
+        for key, _id in self.normalized.items():
+            compact[compact_name(key)].add((key, _id))
+        self.compact = {ckey: keys.pop() for ckey, keys in compact.items() if len(keys) == 1}
+
+        # Symmetric delete index: two keys a single edit apart share the key itself or one of its deletions
+        self.deletes = defaultdict(list)
+        for ckey in self.compact:
+            if len(ckey) >= self.min_typo_length - 1:
+                for variant in deletions(ckey) | {ckey}:
+                    self.deletes[variant].append(ckey)
+
+        self.num_exact = 0
+        self.num_rescued = 0
+        self.num_missed = 0
+
+    def _typo(self, key, ckey):
+        if len(ckey) < self.min_typo_length:
+            return None
+
+        candidates = set()
+        for variant in deletions(ckey) | {ckey}:
+            candidates.update(self.deletes.get(variant, ()))
+
+        matches = {
+            self.compact[candidate] for candidate in candidates
+            if is_single_edit(ckey, candidate) and not is_other_character(key, self.compact[candidate][0])
+        }
+        if len(matches) != 1:
+            # Nothing close enough, or several characters, don't guess
+            return None
+
+        return matches.pop()
+
+    def _lookup(self, name):
+        key = normalize_name(name)
+        if key in self.normalized:
+            return key, self.normalized[key]
+
+        ckey = compact_name(key)
+        if ckey in self.compact:
+            return self.compact[ckey]
+
+        return self._typo(key, ckey)
+
+    def resolve(self, name):
+        """
+        Find the id of a character.
+
+        Parameters
+        ----------
+        name : str
+            Name of the character as read from the page.
+
+        Returns
+        -------
+        int or None
+            Id of the character, ``None`` if no known character is close enough.
+        """
+        _id = self.vocab.get(name)
+        if _id is not None:
+            self.num_exact += 1
+            return _id
+
+        match = self._lookup(name)
+        if match is None:
+            self.num_missed += 1
+            return None
+
+        key, _id = match
+        self.num_rescued += 1
+        logging.info(f"Resolved unknown character {name!r} to {key!r}")
+        return _id
+
+    def info(self):
+        """
+        Number of names found as-is, rescued by normalization or typo correction, and missed.
+        """
+        return {"exact": self.num_exact, "rescued": self.num_rescued, "missed": self.num_missed}
@@ -0,0 +1,247 @@
+import logging
+import os
+import random
+
+import numpy as np
+
+
+class EloRatings:
+    """
+    Elo ratings of every character, updated online as matches finish.
+
+    Parameters
+    ----------
+    k : float, default=32
+        Largest rating change of a single match.
+    initial_rating : float, default=1500
+        Rating of a character never seen before.
+    scale : float, default=400
+        Rating difference at which the stronger character is 10 times more likely to win.
+    """
+
+    def __init__(self, k=32, initial_rating=1500, scale=400):
+        self.k = k
+        self.initial_rating = initial_rating
+        self.scale = scale
+
+        # Character name to its position in `ratings` and `num_matches`
+        self.index = {}
+        self.ratings = []
+        self.num_matches = []
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def _position(self, name):
+        i = self.index.get(name)
+        if i is None:
+            i = self.index[name] = len(self.ratings)
+            self.ratings.append(self.initial_rating)
+            self.num_matches.append(0)
+
+        return i
+
+    def rating(self, name):
+        """
+        Rating of a character, `initial_rating` if it has never been seen.
+        """
+        i = self.index.get(name)
+        return self.initial_rating if i is None else self.ratings[i]
+
+    def expected(self, red, blue):
+        """
+        Probability of red winning.
+        """
+        return 1 / (1 + 10 ** ((self.rating(blue) - self.rating(red)) / self.scale))
+
+    def update(self, red, blue, winner):
+        """
+        Update the ratings of both characters with the result of a match.
+
+        Parameters
+        ----------
+        red : str
+            The name of the red character.
+        blue : str
+            The name of the blue character.
+        winner : str
+            The winning team, "red" or "blue".
+        """
+        if winner not in ("red", "blue"):
+            return
+
+        delta = self.k * ((winner == "red") - self.expected(red, blue))
+        red_pos, blue_pos = self._position(red), self._position(blue)
+        self.ratings[red_pos] += delta
+        self.ratings[blue_pos] -= delta
+        self.num_matches[red_pos] += 1
+        self.num_matches[blue_pos] += 1
+
+    def predict_winner(self, red, blue):
+        """
+        Same interface as `app.utils.helper_functions.predict_winner`.
+
+        Returns
+        -------
+        conf : float
+            The confidence of the prediction, -1 if neither character has been seen.
+        team : str
+            The predicted winner.
+        """
+        if red not in self.index and blue not in self.index:
+            return -1, random.choice(["red", "blue"])
+
+        p = self.expected(red, blue)
+        return (p, "red") if p >= 0.5 else (1 - p, "blue")
+
+    def blend(self, conf, team, red, blue, weight):
+        """
+        Mix a model prediction with the ratings.
+
+        Parameters
+        ----------
+        conf : float
+            Confidence of the model, a negative confidence (no prediction) is returned as is.
+        team : str
+            Team predicted by the model.
+        red : str
+            The name of the red character.
+        blue : str
+            The name of the blue character.
+        weight : float
+            Weight of the ratings, between 0 (model only) and 1 (ratings only).
+
+        Returns
+        -------
+        conf : float
+            The confidence of the blended prediction.
+        team : str
+            The predicted winner.
+        """
+        if conf < 0 or weight <= 0 or (red not in self.index and blue not in self.index):
+            return conf, team
+
+        p_model = conf if team == "red" else 1 - conf
+        p = (1 - weight) * p_model + weight * self.expected(red, blue)
+        return (p, "red") if p >= 0.5 else (1 - p, "blue")
+
+    def save(self, path):
+        """
+        Save the ratings to a ``.npz`` file, replacing it atomically.
+        """
+        tmp_path = f"{path}.tmp.npz"
+        np.savez(
+            tmp_path,
+            names=np.array(list(self.index), dtype=str),
+            ratings=np.array(self.ratings, dtype=np.float64),
+            num_matches=np.array(self.num_matches, dtype=np.int64),
+            params=np.array([self.k, self.initial_rating, self.scale], dtype=np.float64),
+        )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load ratings saved by `save`.
+        """
+        with np.load(path) as data:
+            k, initial_rating, scale = data["params"].tolist()
+            ratings = cls(k=k, initial_rating=initial_rating, scale=scale)
+            ratings.index = {name: i for i, name in enumerate(data["names"].tolist())}
+            ratings.ratings = data["ratings"].tolist()
+            ratings.num_matches = data["num_matches"].tolist()
+
+        logging.info(f"Loaded the ratings of {len(ratings)} characters from {path}")
+        return ratings
+
+    @staticmethod
+    def replay(red, blue, winner, size, k=32, initial_rating=1500, scale=400):
+        """
+        Rate a whole match history at once, with the same results as calling `update` match by match.
+
+        The matches are split into rounds in which no character plays twice, keeping every character's matches in
+        order, and each round is updated as a single vectorized step.
+
+        Parameters
+        ----------
+        red : np.ndarray
+            Character ids of the red team, in match order.
+        blue : np.ndarray
+            Character ids of the blue team.
+        winner : np.ndarray
+            0 when red won, 1 when blue won.
+        size : int
+            Number of ratings, larger than every character id.
+
+        Returns
+        -------
+        ratings : np.ndarray
+            Final rating of every character id.
+        p_red : np.ndarray
+            Probability of red winning each match before it was played, for backtesting.
+        """
+        red = np.asarray(red, dtype=np.int64)
+        blue = np.asarray(blue, dtype=np.int64)
+        score = (np.asarray(winner) == 0).astype(np.float64)
+
+        # A match goes in the round after the last one of either of its characters
+        next_round = [0] * size
+        rounds = np.empty(len(red), dtype=np.int64)
+        for i, (r, b) in enumerate(zip(red.tolist(), blue.tolist())):
+            rounds[i] = current = max(next_round[r], next_round[b])
+            next_round[r] = next_round[b] = current + 1
+
+        order = np.argsort(rounds, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(rounds))))
+
+        ratings = np.full(size, initial_rating, dtype=np.float64)
+        p_red = np.empty(len(red), dtype=np.float64)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            idx = order[start:stop]
+            r, b = red[idx], blue[idx]
+
+            p = 1 / (1 + 10 ** ((ratings[b] - ratings[r]) / scale))
+            delta = k * (score[idx] - p)
+            ratings[r] += delta
+            ratings[b] -= delta
+            p_red[idx] = p
+
+        return ratings, p_red
+
+    @classmethod
+    def from_history(cls, columns, vocab, **kwargs):
+        """
+        Rate an exported match history, see ``model_dev/utils/history.py``.
+
+        Parameters
+        ----------
+        columns : dict[str, np.ndarray]
+            The history columns, ``red``, ``blue`` and ``winner`` are used.
+        vocab : Mapping[str, int]
+            Character name to id.
+
+        Returns
+        -------
+        ratings : EloRatings
+            Ratings of the characters that played.
+        p_red : np.ndarray
+            Probability of red winning each match before it was played.
+        """
+        ratings = cls(**kwargs)
+        size = max(vocab.values(), default=-1) + 1
+        values, p_red = cls.replay(
+            columns["red"], columns["blue"], columns["winner"], size,
+            k=ratings.k, initial_rating=ratings.initial_rating, scale=ratings.scale,
+        )
+        num_matches = np.bincount(columns["red"], minlength=size) + np.bincount(columns["blue"], minlength=size)
+
+        for name, _id in vocab.items():
+            if num_matches[_id] > 0:
+                ratings.index[name] = len(ratings.ratings)
+                ratings.ratings.append(float(values[_id]))
+                ratings.num_matches.append(int(num_matches[_id]))
+
+        return ratings, p_red
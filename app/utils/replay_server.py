@@ -0,0 +1,211 @@
+"""
+Local stand-in for SaltyBet that replays recorded state JSON, used to test the http driver offline.
+
+Record the live feed, then point ``SALTYBET_URL`` at the replay::
+
+    python -m app.utils.replay_server record states.jsonl --duration 3600
+    python -m app.utils.replay_server serve states.jsonl --port 8080
+"""
+import argparse
+import bisect
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+USER_ID = "1"
+INITIAL_BALANCE = 750
+
+
+def record(path, duration, url="https://www.saltybet.com", interval=1.0):
+    """
+    Record every change of the live state.json as a JSON line ``{"t": seconds since start, "state": {...}}``.
+
+    Parameters
+    ----------
+    path : str
+        File to append the recording to.
+    duration : float
+        How long to record for (seconds).
+    url : str, default="https://www.saltybet.com"
+        Base URL of the site.
+    interval : float, default=1.0
+        Time between requests (seconds).
+    """
+    start = time.time()
+    last = None
+
+    with open(path, "a") as f:
+        while time.time() - start < duration:
+            try:
+                with urlopen(f"{url.rstrip('/')}/state.json", timeout=5) as response:
+                    state = json.load(response)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Failed to get state: {e}")
+                state = last
+
+            if state != last:
+                f.write(json.dumps({"t": round(time.time() - start, 3), "state": state}) + "\n")
+                f.flush()
+                last = state
+
+            time.sleep(interval)
+
+
+class Replay:
+    """
+    Replays a recording in a loop and settles the bets placed against it.
+
+    Parameters
+    ----------
+    frames : list[dict]
+        Recorded frames, see `record`.
+    speed : float, default=1.0
+        Playback speed multiplier.
+    """
+
+    def __init__(self, frames, speed=1.0):
+        if not frames:
+            raise ValueError("Recording is empty")
+
+        self.frames = frames
+        self.times = [frame["t"] for frame in frames]
+        self.speed = speed
+        self.length = frames[-1]["t"] + 1
+        self.start = time.time()
+
+        self.lock = threading.Lock()
+        self.balance = INITIAL_BALANCE
+        self.bet = None
+        self.frame_idx = 0
+
+    def state(self):
+        """
+        The frame for the current time, settling our bet when a payout frame is reached.
+        """
+        elapsed = ((time.time() - self.start) * self.speed) % self.length
+        idx = max(bisect.bisect_right(self.times, elapsed) - 1, 0)
+        state = self.frames[idx]["state"]
+
+        with self.lock:
+            if idx != self.frame_idx:
+                self.frame_idx = idx
+                self._settle(state)
+
+        return state
+
+    def _settle(self, state):
+        status = str(state.get("status"))
+        if self.bet is None or status not in {"1", "2"}:
+            return
+
+        player, wager = self.bet
+        self.bet = None
+
+        pots = [int(str(state.get(key, "0")).replace(",", "") or 0) for key in ("p1total", "p2total")]
+        if f"player{status}" != player:
+            self.balance = max(self.balance - wager, INITIAL_BALANCE)
+            return
+
+        ours, theirs = (pots[0], pots[1]) if player == "player1" else (pots[1], pots[0])
+        if ours and theirs:
+            self.balance += round(wager * theirs / ours)
+
+    def place_bet(self, player, wager):
+        with self.lock:
+            if str(self.frames[self.frame_idx]["state"].get("status")) != "open":
+                return False
+            self.bet = (player, min(wager, self.balance))
+            return True
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    replay: Replay = None
+
+    def _send(self, body, content_type="application/json", status=200):
+        body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _index(self):
+        return (
+            f'<html><body><input type="hidden" id="u" value="{USER_ID}">'
+            f'<span class="dollar" id="balance">{self.replay.balance:,}</span></body></html>'
+        )
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+
+        if path == "/state.json":
+            self._send(json.dumps(self.replay.state()))
+        elif path == "/zdata.json":
+            state = dict(self.replay.state())
+            player, wager = self.replay.bet or ("player0", 0)
+            state[USER_ID] = {"n": "replay", "b": str(self.replay.balance), "p": player[-1], "w": str(wager)}
+            self._send(json.dumps(state))
+        elif path == "/":
+            self._send(self._index(), content_type="text/html")
+        else:
+            self._send("", status=404)
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        length = int(self.headers.get("Content-Length", 0))
+        form = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+
+        if path == "/authenticate":
+            # Any credentials work, send the client home like the site does
+            self.send_response(303)
+            self.send_header("Location", "/")
+            self.send_header("Set-Cookie", "PHPSESSID=replay; Path=/")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif path == "/ajax_place_bet.php":
+            placed = self.replay.place_bet(form.get("selectedplayer"), int(form.get("wager", 0)))
+            self._send("1" if placed else "", content_type="text/plain")
+        else:
+            self._send("", status=404)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+def serve(path, host="127.0.0.1", port=8080, speed=1.0):
+    """
+    Serve a recording until interrupted.
+    """
+    with open(path) as f:
+        frames = [json.loads(line) for line in f if line.strip()]
+
+    ReplayHandler.replay = Replay(frames, speed=speed)
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    print(f"Replaying {len(frames)} frames on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--duration", type=float, default=3600)
+    record_parser.add_argument("--url", default="https://www.saltybet.com")
+
+    serve_parser = subparsers.add_parser("serve")
+    serve_parser.add_argument("path")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--speed", type=float, default=1.0)
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.path, args.duration, url=args.url)
+    else:
+        serve(args.path, host=args.host, port=args.port, speed=args.speed)
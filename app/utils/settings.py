@@ -1,3 +1,6 @@
+import os
+from typing import Optional
+
 from pydantic import (
     BaseSettings,
     PostgresDsn,
@@ -12,40 +15,104 @@ class Settings(BaseSettings):
     Attributes
     ----------
     SALTYBET_USERNAME: str
-        Username to your SaltyBet account.
+        Username to your SaltyBet account, only needed to start the driver.
     SALTYBET_PASSWORD: str
-        Password to your SaltyBet account.
+        Password to your SaltyBet account, only needed to start the driver.
     PG_DSN: PostgresDsn
         Postgres Database.
-    MODEL_DIR: FilePath
-        Path to the onnx file to load.
+    MODEL_DIR: DirectoryPath
+        Directory holding the model.onnx file and vocab to load.
+    MODELS_DIR: str
+        Directory of the model versions written by model_dev/train.py.
+    WATCH_MODELS: bool
+        Swap in new model versions from MODELS_DIR between matches, without restarting.
+    MODEL_POLL_INTERVAL: float
+        Time between checks for a new model version (seconds).
+    USE_DOM_OBSERVER: bool
+        Push page changes from a MutationObserver instead of polling the elements.
+    OBSERVER_POLL_TIMEOUT: float
+        Longest time (seconds) a single observer long-poll may hold the browser.
+    DRIVER_BACKEND: str
+        Driver used to talk to SaltyBet, either "selenium" (headless Firefox) or "http" (state JSON feed).
+    SALTYBET_URL: str
+        Base URL of the site, point it at a replay server to test the http backend offline.
+    PREDICTION_CACHE_SIZE: int
+        Number of match up predictions kept in memory.
+    INFERENCE_INTRA_OP_THREADS: int
+        Threads ONNX Runtime uses inside an operator, 0 for one per core. One is fastest for single predictions.
+    INFERENCE_INTER_OP_THREADS: int
+        Threads ONNX Runtime uses to run operators in parallel, 0 for one per core.
+    INFERENCE_OPTIMIZATION: str
+        ONNX Runtime graph optimization level, one of "disable", "basic", "extended" or "all".
+    INFERENCE_SAVE_OPTIMIZED: bool
+        Save the optimized graph next to the model and reuse it on the next load.
+    SPOOL_PATH: str
+        SQLite file finished matches are spooled to before they are written to Postgres.
+    RATINGS_PATH: str
+        File the online Elo ratings are saved to after every match.
+    RATINGS_WEIGHT: float
+        Weight of the Elo ratings when blended with the model confidence, 0 to only use the model.
     """
 
     # Credentials
-    SALTYBET_USERNAME: str
-    SALTYBET_PASSWORD: str
+    SALTYBET_USERNAME: Optional[str] = None
+    SALTYBET_PASSWORD: Optional[str] = None
     PG_DSN: PostgresDsn = None  # Optional
 
     # Files
     MODEL_DIR: DirectoryPath = None
+    MODELS_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+    SPOOL_PATH: str = "match_spool.sqlite3"
+    RATINGS_PATH: str = "ratings.npz"
     # JSON_PATH: FilePath = None
 
     # How long to wait in while loops (seconds)
     WAIT_TIME: int = 5
     STATE_UPDATE_INTERVAL: int = 1
 
+    # Model
+    PREDICTION_CACHE_SIZE: int = 4096
+    INFERENCE_INTRA_OP_THREADS: int = 1
+    INFERENCE_INTER_OP_THREADS: int = 1
+    INFERENCE_OPTIMIZATION: str = "all"
+    INFERENCE_SAVE_OPTIMIZED: bool = True
+    WATCH_MODELS: bool = False
+    MODEL_POLL_INTERVAL: float = 30
+    RATINGS_WEIGHT: float = 0.0
+
+    # Driver
+    USE_DOM_OBSERVER: bool = False
+    OBSERVER_POLL_TIMEOUT: float = 0.25
+    DRIVER_BACKEND: str = "selenium"
+    SALTYBET_URL: str = "https://www.saltybet.com"
+
     @validator('MODEL_DIR')
     def model_validator(cls, v):
         # If we don't have a model, don't validate it
         if v is None:
             return None
 
-        import onnx
-        import os
-        model = onnx.load(os.path.join(v, 'model.onnx'))
-        onnx.checker.check_model(model)
+        # Only check the file is there, the model itself is loaded and checked on first use
+        if not os.path.isfile(os.path.join(v, 'model.onnx')):
+            raise ValueError(f"No model.onnx in {v}")
 
         return str(v)
 
+    @validator('INFERENCE_OPTIMIZATION')
+    def optimization_validator(cls, v):
+        v = v.lower()
+        if v not in {"disable", "basic", "extended", "all"}:
+            raise ValueError(f"Unknown graph optimization level: {v}")
+
+        return v
+
+    @validator('DRIVER_BACKEND')
+    def backend_validator(cls, v):
+        v = v.lower()
+        if v not in {"selenium", "http"}:
+            raise ValueError(f"Unknown driver backend: {v}")
+
+        return v
+
 
 settings = Settings()
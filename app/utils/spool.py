@@ -0,0 +1,123 @@
+import sqlite3
+import threading
+import uuid
+
+
+class MatchSpool:
+    def __init__(self, path):
+        """
+        Append-only local log of finished matches, kept until they are safely in Postgres.
+
+        Every match gets a unique ``spool_id`` so a replay after a partial flush can be deduplicated.
+
+        Parameters
+        ----------
+        path : str
+            SQLite file to spool to, created if missing.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS spool (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                spool_id TEXT NOT NULL UNIQUE,
+                red TEXT NOT NULL,
+                blue TEXT NOT NULL,
+                winner TEXT NOT NULL,
+                red_pot INTEGER,
+                blue_pot INTEGER
+            )
+        """)
+        # Records Postgres refused, kept for a look rather than blocking the spool
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                seq INTEGER PRIMARY KEY,
+                spool_id TEXT NOT NULL,
+                red TEXT NOT NULL,
+                blue TEXT NOT NULL,
+                winner TEXT NOT NULL,
+                red_pot INTEGER,
+                blue_pot INTEGER,
+                error TEXT NOT NULL,
+                failed_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def append(self, red, blue, winner, pots=None):
+        """
+        Durably record a finished match.
+
+        Returns
+        -------
+        spool_id : str
+            The id of the record.
+        """
+        spool_id = uuid.uuid4().hex
+        red_pot, blue_pot = pots if pots is not None else (None, None)
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT INTO spool (spool_id, red, blue, winner, red_pot, blue_pot) VALUES (?, ?, ?, ?, ?, ?)",
+                (spool_id, red, blue, winner, red_pot, blue_pot),
+            )
+
+        return spool_id
+
+    def peek(self, limit):
+        """
+        The oldest records, without removing them.
+
+        Returns
+        -------
+        list[tuple[int, tuple]]
+            The sequence number and the (red, blue, winner, pots, spool_id) of each record.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT seq, spool_id, red, blue, winner, red_pot, blue_pot FROM spool ORDER BY seq LIMIT ?",
+                (limit,),
+            ).fetchall()
+
+        return [
+            (seq, (red, blue, winner, None if red_pot is None else (red_pot, blue_pot), spool_id))
+            for seq, spool_id, red, blue, winner, red_pot, blue_pot in rows
+        ]
+
+    def remove(self, last_seq):
+        """
+        Remove the flushed records, every record up to and including `last_seq`.
+        """
+        with self._lock:
+            self._connection.execute("DELETE FROM spool WHERE seq <= ?", (last_seq,))
+
+    def dead_letter(self, seq, error):
+        """
+        Move a record that can't be written to the ``dead_letter`` table, with the error it failed with.
+        """
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.execute(
+                    "INSERT OR REPLACE INTO dead_letter (seq, spool_id, red, blue, winner, red_pot, blue_pot, error) "
+                    "SELECT seq, spool_id, red, blue, winner, red_pot, blue_pot, ? FROM spool WHERE seq = ?",
+                    (error, seq),
+                )
+                self._connection.execute("DELETE FROM spool WHERE seq = ?", (seq,))
+            except BaseException:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+
+    def num_dead_letters(self):
+        """
+        Number of records moved to the ``dead_letter`` table.
+        """
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
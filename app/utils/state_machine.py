@@ -3,7 +3,7 @@ import threading
 import time
 from enum import Enum
 
-from app.utils.driver import driver
+from app.utils.driver import get_driver
 
 
 class StateMachine:
@@ -21,6 +21,7 @@ class StateMachine:
         """
         self._state = self.States.START
         self._last_state = self.States.START
+        self.state_changed_at = time.time()
         self._lock = threading.Lock()
         self._condition = threading.Condition(self._lock)
         self._thread = threading.Thread(target=self._update_state, daemon=True)
@@ -45,13 +46,24 @@ class StateMachine:
         """
         Updates the state of the state machine.
         """
+        driver = get_driver()
+        state_text = None
         while True:
-            time.sleep(self.STATE_UPDATE_INTERVAL)
-            state_text = driver.get_bet_status()
+            if driver.observing:
+                # Changes are pushed by the page, no need to poll
+                text = driver.wait_for_bet_status(last=state_text)
+                if text is None:
+                    # No change yet, or the observer stopped and the next read polls
+                    continue
+                state_text = text
+            else:
+                time.sleep(self.STATE_UPDATE_INTERVAL)
+                state_text = driver.get_bet_status()
             state = self._decode_state_text(state_text)
             if state != self._state:
                 with self._condition:
                     self._state = state
+                    self.state_changed_at = time.time()
                     self._condition.notify_all()
                     logging.debug(f"State changed to {state.name}")
 
@@ -0,0 +1,138 @@
+import bisect
+import json
+import os
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+VOCAB_FILE = "vocab.bin"
+JSON_VOCAB_FILE = "vocab.json"
+
+MAGIC = b"SBVOCAB1"
+# Magic, number of names and size of the name blob
+HEADER = np.dtype([("magic", "S8"), ("num_names", "<u8"), ("blob_size", "<u8")])
+
+
+def write_vocab(vocab, file_name):
+    """
+    Write a vocab in the compact binary format read by `CompactVocab`.
+
+    The file holds the header, the offsets of every name in the blob, the ids in name order and the blob of the
+    UTF-8 names sorted bytewise, so a lookup is a binary search over the memory-mapped file.
+
+    Parameters
+    ----------
+    vocab : dict[str, int]
+        Character name to id.
+    file_name : str
+        File to write.
+    """
+    names = sorted((name.encode("utf-8"), _id) for name, _id in vocab.items())
+
+    offsets = np.zeros(len(names) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(name) for name, _ in names])
+    ids = np.array([_id for _, _id in names], dtype="<i8")
+    blob = b"".join(name for name, _ in names)
+
+    header = np.array([(MAGIC, len(names), len(blob))], dtype=HEADER)
+    with open(f"{file_name}.tmp", "wb") as f:
+        f.write(header.tobytes())
+        f.write(offsets.tobytes())
+        f.write(ids.tobytes())
+        f.write(blob)
+    os.replace(f"{file_name}.tmp", file_name)
+
+
+class _Names(Sequence):
+    # Sorted view of the names as bytes, for bisect
+    def __init__(self, offsets, blob):
+        self.offsets = offsets
+        self.blob = blob
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes()
+
+
+class CompactVocab(Mapping):
+    """
+    Read-only character name to id mapping, memory-mapped from a file written by `write_vocab`.
+
+    Nothing is parsed or copied when opening, and every process opening the same file shares its pages, so it
+    costs next to nothing next to the equivalent ``dict``. Lookups are a binary search over the sorted names.
+
+    Parameters
+    ----------
+    file_name : str
+        The ``vocab.bin`` file to open.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+
+        data = np.memmap(file_name, dtype=np.uint8, mode="r")
+        header = data[:HEADER.itemsize].view(HEADER)[0]
+        if header["magic"] != MAGIC:
+            raise ValueError(f"{file_name} is not a vocab file")
+
+        num_names, blob_size = int(header["num_names"]), int(header["blob_size"])
+        start = HEADER.itemsize
+        self.offsets = data[start:start + 8 * (num_names + 1)].view("<u8")
+        start += 8 * (num_names + 1)
+        self.ids = data[start:start + 8 * num_names].view("<i8")
+        start += 8 * num_names
+        self._names = _Names(self.offsets, data[start:start + blob_size])
+
+    def __reduce__(self):
+        # Reopen by file name instead of pickling the mapped data, so workers share the pages
+        return CompactVocab, (self.file_name,)
+
+    def _find(self, name):
+        key = name.encode("utf-8")
+        i = bisect.bisect_left(self._names, key)
+        if i < len(self._names) and self._names[i] == key:
+            return i
+        return -1
+
+    def __getitem__(self, name):
+        i = self._find(name) if isinstance(name, str) else -1
+        if i < 0:
+            raise KeyError(name)
+        return int(self.ids[i])
+
+    def __contains__(self, name):
+        return isinstance(name, str) and self._find(name) >= 0
+
+    def __iter__(self):
+        for i in range(len(self._names)):
+            yield self._names[i].decode("utf-8")
+
+    def __len__(self):
+        return len(self._names)
+
+    def values(self):
+        return self.ids
+
+
+def load_vocab(model_dir):
+    """
+    Load the vocab of a model, preferring ``vocab.bin`` over ``vocab.json``.
+
+    Parameters
+    ----------
+    model_dir : str
+        Directory of the model.
+
+    Returns
+    -------
+    CompactVocab or dict[str, int]
+        Character name to id.
+    """
+    file_name = os.path.join(model_dir, VOCAB_FILE)
+    if os.path.exists(file_name):
+        return CompactVocab(file_name)
+
+    with open(os.path.join(model_dir, JSON_VOCAB_FILE)) as f:
+        return json.load(f)
@@ -0,0 +1,123 @@
+import logging
+import random
+
+import numpy as np
+
+
+class WinRateTable:
+    """
+    In-memory win and match counts of every character, used to predict match ups the model has no embedding for.
+
+    Win rates are shrunk toward 0.5 by `prior_matches` virtual matches, so a character with a handful of matches
+    doesn't look like a sure thing, and two rates are combined with the log5 formula.
+
+    Parameters
+    ----------
+    counts : dict[str, tuple[int, int]], default=None
+        Character name to (num_wins, num_matches).
+    prior_matches : float, default=10
+        Strength of the 0.5 prior, in matches.
+    """
+
+    def __init__(self, counts=None, prior_matches=10):
+        self.counts = dict(counts or {})
+        self.prior_matches = prior_matches
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def from_database(cls, engine, **kwargs):
+        """
+        Load the counts kept by the ``characters`` table.
+        """
+        from sqlalchemy import select
+        from sqlalchemy.orm import Session
+
+        import app.utils.database as db
+
+        with Session(engine) as session:
+            rows = session.execute(select(db.Character.name, db.Character.num_wins, db.Character.num_matches))
+            counts = {name: (num_wins, num_matches) for name, num_wins, num_matches in rows}
+
+        logging.info(f"Loaded the win rates of {len(counts)} characters")
+        return cls(counts, **kwargs)
+
+    @classmethod
+    def from_history(cls, columns, vocab, **kwargs):
+        """
+        Count the wins and matches in an exported match history, see ``model_dev/utils/history.py``.
+
+        Parameters
+        ----------
+        columns : dict[str, np.ndarray]
+            The history columns, ``red``, ``blue`` and ``winner`` are used.
+        vocab : Mapping[str, int]
+            Character name to id.
+        """
+        size = max(vocab.values(), default=-1) + 1
+        red, blue = np.asarray(columns["red"]), np.asarray(columns["blue"])
+        red_won = np.asarray(columns["winner"]) == 0
+
+        num_matches = np.bincount(red, minlength=size) + np.bincount(blue, minlength=size)
+        num_wins = np.bincount(red[red_won], minlength=size) + np.bincount(blue[~red_won], minlength=size)
+
+        counts = {
+            name: (int(num_wins[_id]), int(num_matches[_id]))
+            for name, _id in vocab.items()
+            if num_matches[_id] > 0
+        }
+        return cls(counts, **kwargs)
+
+    def record(self, red, blue, winner):
+        """
+        Count a finished match.
+
+        Parameters
+        ----------
+        red : str
+            The name of the red character.
+        blue : str
+            The name of the blue character.
+        winner : str
+            The winning team, "red" or "blue". Anything else, e.g. ``None`` for a tie, isn't counted.
+        """
+        if winner not in ("red", "blue"):
+            return
+
+        for name, team in ((red, "red"), (blue, "blue")):
+            num_wins, num_matches = self.counts.get(name, (0, 0))
+            self.counts[name] = (num_wins + (winner == team), num_matches + 1)
+
+    def win_rate(self, name):
+        """
+        Shrunk win rate of a character, 0.5 if it has never been seen.
+        """
+        num_wins, num_matches = self.counts.get(name, (0, 0))
+        return (num_wins + 0.5 * self.prior_matches) / (num_matches + self.prior_matches)
+
+    def predict_winner(self, red, blue):
+        """
+        Same interface as `app.utils.helper_functions.predict_winner`.
+
+        Parameters
+        ----------
+        red : str
+            The name of the red character.
+        blue : str
+            The name of the blue character.
+
+        Returns
+        -------
+        conf : float
+            The confidence of the prediction, -1 if neither character has been seen.
+        team : str
+            The predicted winner.
+        """
+        if red not in self.counts and blue not in self.counts:
+            return -1, random.choice(["red", "blue"])
+
+        p_red, p_blue = self.win_rate(red), self.win_rate(blue)
+        p = p_red * (1 - p_blue) / (p_red * (1 - p_blue) + p_blue * (1 - p_red))
+
+        return (p, "red") if p >= 0.5 else (1 - p, "blue")
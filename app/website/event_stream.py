@@ -0,0 +1,88 @@
+import json
+from collections import deque
+
+from gevent.queue import Empty, Full, Queue
+
+
+class _Client:
+    def __init__(self, max_queue):
+        self.queue = Queue(maxsize=max_queue)
+        self.dropped = False
+
+
+class EventStream:
+    def __init__(self, history_size=10, max_queue=32, heartbeat=15):
+        """
+        Fans dashboard events out to Server-Sent Events clients.
+
+        New clients first receive the latest main update and the last `history_size` history events. Clients that
+        fall `max_queue` events behind are dropped instead of slowing down the publisher.
+
+        All methods must be called from the web server's thread, they use its gevent hub.
+
+        Parameters
+        ----------
+        history_size : int, default=10
+            Number of history events replayed to new clients.
+        max_queue : int, default=32
+            Number of events a client may be behind before it is dropped.
+        heartbeat : float, default=15
+            Time between keep-alive comments on an idle stream (seconds).
+        """
+        self.max_queue = max_queue
+        self.heartbeat = heartbeat
+
+        self.latest_main = None
+        self.history = deque(maxlen=history_size)
+        self.clients = set()
+
+    @staticmethod
+    def _format(content, event_type):
+        return f"event: {event_type}\ndata: {json.dumps(content)}\n\n"
+
+    def broadcast(self, content, event_type):
+        """
+        Record an event and send it to every connected client.
+
+        Parameters
+        ----------
+        content : dict
+            Data of the event.
+        event_type : str
+            Either 'main' or 'history'.
+        """
+        if event_type == 'main':
+            self.latest_main = content
+        else:
+            self.history.append(content)
+
+        message = self._format(content, event_type)
+        for client in list(self.clients):
+            try:
+                client.queue.put_nowait(message)
+            except Full:
+                # Too slow, drop it so the other clients don't wait
+                client.dropped = True
+                self.clients.discard(client)
+
+    def stream(self):
+        """
+        Generator of Server-Sent Events for one client, starting with the current snapshot.
+        """
+        client = _Client(self.max_queue)
+
+        yield "retry: 3000\n\n"
+        if self.latest_main is not None:
+            yield self._format(self.latest_main, 'main')
+        for content in list(self.history):
+            yield self._format(content, 'history')
+
+        self.clients.add(client)
+        try:
+            while not client.dropped:
+                try:
+                    yield client.queue.get(timeout=self.heartbeat)
+                except Empty:
+                    yield ": heartbeat\n\n"
+        finally:
+            self.clients.discard(client)
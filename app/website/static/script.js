@@ -1,9 +1,6 @@
 // Imports
 // import { build_match_history_element } from './utils/helper_functions.js';
 
-const storageKey = 'last-event-data';
-
-eel.expose(updateMain);
 function updateMain(data) {
 
     console.log('Received update event: ', data);
@@ -78,12 +75,8 @@ function updateMain(data) {
     if (confidence < 0) {
         elements.confidence.text('NaN');
     }
-
-    // Save the last event data to localStorage
-    localStorage.setItem(storageKey, data);
 }
 
-eel.expose(updateHistory);
 function updateHistory(history_data) {
     console.log("Received history event:", history_data);
     const matchElement = build_match_history_element(history_data);
@@ -99,13 +92,17 @@ function updateHistory(history_data) {
     }
 }
 
-// If there is last event data, use it to populate the website when it loads
+// Subscribe to the event stream, the server replays the latest state and recent history on connect
 $(document).ready(function () {
-    // Retrieve the last event data from localStorage
-    const lastEventData = localStorage.getItem(storageKey);
-    if (lastEventData) {
-        updateMain(lastEventData);
-    }
+    const events = new EventSource('/events');
+
+    events.addEventListener('main', function (event) {
+        updateMain(JSON.parse(event.data));
+    });
+
+    events.addEventListener('history', function (event) {
+        updateHistory(JSON.parse(event.data));
+    });
 });
 
 function build_match_history_element(match_json) {
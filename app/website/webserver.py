@@ -1,16 +1,60 @@
+import logging
 import os
+import threading
+from collections import deque
+
 import eel
 
+from website.event_stream import EventStream
+
 
 class WebServer:
-    def __init__(self, host='0.0.0.0', port=8000):
+    def __init__(self, host='0.0.0.0', port=8000, max_history=100, flush_interval=0.1, replay_history=10):
+        """
+        Initialize the web server.
+
+        Parameters
+        ----------
+        host : str, default='0.0.0.0'
+            Host to serve the dashboard on.
+        port : int, default=8000
+            Port to serve the dashboard on.
+        max_history : int, default=100
+            Maximum number of history events waiting to be sent, the oldest are dropped past this.
+        flush_interval : float, default=0.1
+            Time between sending queued events (seconds).
+        replay_history : int, default=10
+            Number of history events sent to a dashboard when it connects.
+        """
         self.eel = eel
         self.host = host
         self.port = port
+        self.max_history = max_history
+        self.flush_interval = flush_interval
+
+        # Only the latest main update is kept, history events are sent in order
+        self._lock = threading.Lock()
+        self._latest_main = None
+        self._history = deque()
+
+        # Events are streamed to the dashboards over Server-Sent Events at /events
+        self.stream = EventStream(history_size=replay_history)
+
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
 
     def start(self):
+        """
+        Start serving on a background thread, returns once the server is up.
+        """
+        self._thread.start()
+        self._started.wait()
+
+    def _serve(self):
+        # eel serves from the gevent hub of this thread, which only runs while we are in eel.sleep
         print(f"Starting web server on {self.host}:{self.port}")
         self.eel.init(os.path.dirname(__file__), allowed_extensions=['.js', '.html'])
+        self.eel.btl.route('/events')(self._events)
         self.eel.start(
             'templates/index.html',
             host=self.host,
@@ -19,21 +63,55 @@ class WebServer:
             mode='chrome-app',
             block=False
         )
-        self.eel.sleep(1)
+        self._started.set()
 
-    def publish(self, content, event_type):
-        match event_type:
-            case 'main':
-                self.update_main(content)
-            case 'history':
+        while True:
+            self._flush()
+            self.eel.sleep(self.flush_interval)
+
+    def _flush(self):
+        with self._lock:
+            main, self._latest_main = self._latest_main, None
+            history = list(self._history)
+            self._history.clear()
+
+        try:
+            for content in history:
                 self.update_history(content)
-        self.eel.sleep(1)
+            if main is not None:
+                self.update_main(main)
+        except Exception as e:
+            logging.warning(f"Failed to publish to the web server: {e}")
 
-    def update_main(self, content):
-        self.eel.updateMain(content)
+    def publish(self, content, event_type):
+        """
+        Queue an update for the dashboard. Never blocks on the UI.
 
-    def update_history(self, content):
-        self.eel.updateHistory(content)
+        Parameters
+        ----------
+        content : dict
+            Data of the event.
+        event_type : str
+            Either 'main', replacing any main update not sent yet, or 'history'.
+        """
+        with self._lock:
+            match event_type:
+                case 'main':
+                    self._latest_main = dict(content)
+                case 'history':
+                    if len(self._history) >= self.max_history:
+                        self._history.popleft()
+                        logging.warning("Dropping history event, the web server is falling behind")
+                    self._history.append(dict(content))
 
+    def _events(self):
+        response = self.eel.btl.response
+        response.content_type = 'text/event-stream'
+        response.set_header('Cache-Control', 'no-cache')
+        return self.stream.stream()
 
+    def update_main(self, content):
+        self.stream.broadcast(content, 'main')
 
+    def update_history(self, content):
+        self.stream.broadcast(content, 'history')
@@ -0,0 +1,77 @@
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.inference import Predictor, create_session
+from app.utils.settings import settings
+from app.utils.vocab import load_vocab
+
+
+def percentiles(latencies):
+    """
+    p50 and p99 of a list of latencies, in microseconds.
+    """
+    return np.percentile(np.array(latencies) * 1e6, [50, 99])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single and batched inference of a model.")
+    parser.add_argument("model_dir", nargs="?", default=settings.MODEL_DIR)
+    parser.add_argument("--runs", type=int, default=10000, help="Number of single predictions to time.")
+    parser.add_argument("--batch-size", type=int, default=2 ** 14, help="Pairs per batched prediction.")
+    parser.add_argument("--batches", type=int, default=20, help="Number of batched predictions to time.")
+    parser.add_argument("--intra-op-threads", type=int, default=settings.INFERENCE_INTRA_OP_THREADS)
+    parser.add_argument("--inter-op-threads", type=int, default=settings.INFERENCE_INTER_OP_THREADS)
+    parser.add_argument("--optimization", default=settings.INFERENCE_OPTIMIZATION)
+    args = parser.parse_args()
+
+    size = max(load_vocab(args.model_dir).values()) + 1
+    rng = np.random.default_rng(0)
+    pairs = rng.integers(0, size, (max(args.runs, args.batch_size), 2), dtype=np.int64)
+
+    start = time.perf_counter()
+    session = create_session(
+        args.model_dir,
+        intra_op_threads=args.intra_op_threads,
+        inter_op_threads=args.inter_op_threads,
+        optimization=args.optimization,
+    )
+    print(f"Session created in {(time.perf_counter() - start) * 1e3:.1f}ms")
+
+    # First call of a fresh session, before any warm-up
+    start = time.perf_counter()
+    session.run(None, {"input": pairs[:1]})
+    print(f"First call:       {(time.perf_counter() - start) * 1e6:.0f}us")
+
+    predictor = Predictor(session)
+
+    # Plain session.run, allocating the input and output every call
+    latencies = []
+    for red, blue in pairs[:args.runs]:
+        start = time.perf_counter()
+        session.run(None, {"input": np.array([[red, blue]], dtype=np.int64)})
+        latencies.append(time.perf_counter() - start)
+    p50, p99 = percentiles(latencies)
+    print(f"session.run:      p50 {p50:.1f}us  p99 {p99:.1f}us")
+
+    # Predictor, with the pre-bound buffers
+    latencies = []
+    for red, blue in pairs[:args.runs].tolist():
+        start = time.perf_counter()
+        predictor.predict_pair(red, blue)
+        latencies.append(time.perf_counter() - start)
+    p50, p99 = percentiles(latencies)
+    print(f"predict_pair:     p50 {p50:.1f}us  p99 {p99:.1f}us")
+
+    batch = pairs[:args.batch_size]
+    predictor.predict(batch)
+    start = time.perf_counter()
+    for _ in range(args.batches):
+        predictor.predict(batch)
+    elapsed = time.perf_counter() - start
+    print(f"Batched:          {args.batches * len(batch) / elapsed:,.0f} pairs/s (batches of {len(batch)})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import gc
+import time
+
+import torch
+from torch.nn import CrossEntropyLoss
+from torch.utils.data import DataLoader, TensorDataset
+
+from utils.model import BetBot
+from utils.training import autocast, get_device, make_optimizers, set_threads
+
+
+def benchmark(num_characters, batch_size, num_steps, sparse, amp, device):
+    """
+    Training throughput of `BetBot` on random match ups.
+
+    Returns
+    -------
+    float
+        Samples per second, not counting the warm-up steps.
+    """
+    torch.manual_seed(0)
+    model = BetBot(num_characters, sparse=sparse).to(device).train()
+    optimizers = make_optimizers(model)
+    loss_fn = CrossEntropyLoss()
+
+    inputs = torch.randint(0, num_characters + 1, (batch_size, 2), device=device)
+    labels = torch.eye(2, device=device)[torch.randint(0, 2, (batch_size,), device=device)]
+
+    def step():
+        with autocast(device, enabled=amp):
+            loss = loss_fn(model(inputs), labels)
+        loss.backward()
+        for optimizer in optimizers:
+            optimizer.step()
+            optimizer.zero_grad()
+
+    for _ in range(3):
+        step()
+
+    if device == "cuda":
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(num_steps):
+        step()
+    if device == "cuda":
+        torch.cuda.synchronize()
+
+    return num_steps * batch_size / (time.perf_counter() - start)
+
+
+# Each tuning of train.py on its own, then all of them, against the training loop they replaced
+EPOCH_CONFIGS = {
+    "before": dict(batch_loader=False, collect_garbage=True, amp=False, sparse=False),
+    "BatchLoader": dict(batch_loader=True, collect_garbage=True, amp=False, sparse=False),
+    "no gc": dict(batch_loader=False, collect_garbage=False, amp=False, sparse=False),
+    "amp": dict(batch_loader=False, collect_garbage=True, amp=True, sparse=False),
+    "sparse": dict(batch_loader=False, collect_garbage=True, amp=False, sparse=True),
+    "all, dense": dict(batch_loader=True, collect_garbage=False, amp=True, sparse=False),
+    "all": dict(batch_loader=True, collect_garbage=False, amp=True, sparse=True),
+}
+
+
+def benchmark_epoch(num_characters, loader, batch_loader, collect_garbage, amp, sparse, device):
+    """
+    One epoch of the `train.py` training loop over the real match history.
+
+    Parameters
+    ----------
+    loader : utils.data.BatchLoader
+        The data, iterated as is or through the `DataLoader` it replaced.
+    batch_loader : bool
+        Iterate `loader`, else a shuffling `DataLoader` over the same tensors.
+    collect_garbage : bool
+        Run ``gc.collect()`` and ``torch.cuda.empty_cache()`` after every step, like the old loop.
+    amp : bool
+        Mixed precision, see `utils.training.autocast`.
+    sparse : bool
+        Sparse embedding gradients, see `utils.training.make_optimizers`.
+
+    Returns
+    -------
+    samples_per_sec : float
+        Training throughput.
+    accuracy : float
+        Training accuracy over the epoch.
+    """
+    torch.manual_seed(0)
+    model = BetBot(num_characters, sparse=sparse).to(device).train()
+    optimizers = make_optimizers(model)
+    loss_fn = CrossEntropyLoss()
+    scaler = torch.cuda.amp.GradScaler(enabled=device == "cuda" and amp)
+    num_accumulation_steps = 4
+
+    if not batch_loader:
+        loader = DataLoader(TensorDataset(loader.x, loader.y), batch_size=loader.batch_size, shuffle=True)
+
+    correct = 0
+    count = 0
+    start = time.perf_counter()
+    for idx, (inputs, labels) in enumerate(loader):
+        inputs, labels = inputs.to(device), labels.to(device)
+
+        with autocast(device, enabled=amp):
+            outputs = model(inputs)
+            loss = loss_fn(outputs, labels)
+        scaler.scale(loss).backward()
+
+        if ((idx + 1) % num_accumulation_steps == 0) or (idx + 1 == len(loader)):
+            for optimizer in optimizers:
+                scaler.step(optimizer)
+                optimizer.zero_grad()
+            scaler.update()
+
+        if collect_garbage:
+            torch.cuda.empty_cache()
+            gc.collect()
+
+        count += inputs.shape[0]
+        correct += torch.sum(torch.argmax(outputs, dim=1) == torch.argmax(labels, dim=1)).item()
+
+    if device == "cuda":
+        torch.cuda.synchronize()
+
+    return count / (time.perf_counter() - start), correct / max(count, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark training throughput with and without the CPU tunings, on random match ups or, with "
+                    "--epoch, end to end over the match history against the old DataLoader and per-step gc loop."
+    )
+    parser.add_argument("--num-characters", type=int, default=10000)
+    parser.add_argument("--batch-size", type=int, default=2 ** 10)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("--epoch", action="store_true",
+                        help="Time one epoch of the real match history (production_loader) for every tuning, "
+                             "instead of random match ups.")
+    parser.add_argument("--epochs", type=int, default=100, help="Number of epochs the --epoch estimates are for.")
+    parser.add_argument("--threads", type=int, default=None, help="Threads used inside an operator.")
+    parser.add_argument("--interop-threads", type=int, default=None, help="Threads used across operators.")
+    args = parser.parse_args()
+
+    set_threads(args.threads, args.interop_threads)
+    device = get_device()
+    print(f"Using device: {device}, {torch.get_num_threads()} threads")
+
+    if args.epoch:
+        # Imported here, loading the match history takes a while
+        from utils.data import num_characters, production_loader
+
+        print(f"{'':>12} | {'samples/s':>12} | {'epoch':>8} | {f'{args.epochs} epochs':>10} | {'accuracy':>8}")
+        for name, config in EPOCH_CONFIGS.items():
+            samples_per_sec, accuracy = benchmark_epoch(num_characters, production_loader, device=device, **config)
+            epoch_time = len(production_loader.x) / samples_per_sec
+            print(f"{name:>12} | {samples_per_sec:>12,.0f} | {epoch_time:>7.1f}s | "
+                  f"{epoch_time * args.epochs / 3600:>9.2f}h | {accuracy:>8.2%}")
+        return
+
+    for sparse in (False, True):
+        for amp in (False, True):
+            samples_per_sec = benchmark(args.num_characters, args.batch_size, args.steps, sparse, amp, device)
+            print(f"{'sparse' if sparse else 'dense':>6} | {'amp' if amp else 'fp32':>4} | "
+                  f"{samples_per_sec:>12,.0f} samples/s")
+
+
+if __name__ == '__main__':
+    main()
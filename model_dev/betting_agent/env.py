@@ -3,45 +3,49 @@ from random import shuffle
 import gym
 import numpy as np
 from gym import spaces
-from sqlalchemy.orm import Session, aliased
 
-import app.utils.database as db
-from app.utils.helper_functions import predict_winner
+from app.utils.confidence_matrix import ConfidenceMatrix
+from app.utils.settings import settings
+from utils.history import load_history
+
+# Use the precomputed matrix when the model has one, it avoids a model run per step
+if ConfidenceMatrix.exists(settings.MODEL_DIR):
+    predict_winner = ConfidenceMatrix(settings.MODEL_DIR).predict_winner
+else:
+    from app.utils.helper_functions import predict_winner
 
 INITIAL_BALANCE = 750
 
 
 class SaltyBetEnv(gym.Env):
     def __init__(self):
-        with Session(db.engine) as session:
-            red = aliased(db.Character)
-            blue = aliased(db.Character)
-
-            match_data = session.query(
-                red.name,
-                blue.name,
-                db.Match.winner,
-                db.MatchMetadata.red_pot,
-                db.MatchMetadata.blue_pot
-            ).join(
-                red, db.Match.red == red.name
-            ).join(
-                blue, db.Match.blue == blue.name
-            ).filter(
-                db.Match.id == db.MatchMetadata.match_id
-            ).all()
-
-            self.match_data = match_data
-            self.match_idx = 0
-
-            self.observation_space = spaces.Dict({
-                'confidence': spaces.Box(low=0.5, high=1.0, shape=(1,), dtype='float32'),
-                'balance': spaces.Box(low=INITIAL_BALANCE, high=float('inf'), shape=(1,), dtype='float32')
-            })
-
-            self.action_space = spaces.Box(low=0.01, high=1, shape=(1,), dtype='float32')
+        # Memory-map the exported match history, see export_history.py
+        columns, vocab = load_history()
+        names = {_id: name for name, _id in vocab.items()}
+        has_pots = (columns["red_pot"] > 0) & (columns["blue_pot"] > 0)
+
+        match_data = [
+            (names[red], names[blue], "red" if winner == 0 else "blue", int(red_pot), int(blue_pot))
+            for red, blue, winner, red_pot, blue_pot in zip(
+                columns["red"][has_pots],
+                columns["blue"][has_pots],
+                columns["winner"][has_pots],
+                columns["red_pot"][has_pots],
+                columns["blue_pot"][has_pots],
+            )
+        ]
+
+        self.match_data = match_data
+        self.match_idx = 0
 
-            self.balance = INITIAL_BALANCE
+        self.observation_space = spaces.Dict({
+            'confidence': spaces.Box(low=0.5, high=1.0, shape=(1,), dtype='float32'),
+            'balance': spaces.Box(low=INITIAL_BALANCE, high=float('inf'), shape=(1,), dtype='float32')
+        })
+
+        self.action_space = spaces.Box(low=0.01, high=1, shape=(1,), dtype='float32')
+
+        self.balance = INITIAL_BALANCE
 
     def reset(self):
         self.match_idx = 0
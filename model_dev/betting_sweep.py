@@ -0,0 +1,181 @@
+import argparse
+import csv
+import itertools
+import os
+import time
+from functools import partial
+from multiprocessing import Pool, shared_memory
+
+import numpy as np
+
+from utils.simulation import (
+    calculate_bet_amount,
+    calculate_risk_bet,
+    drop_unscored,
+    load_match_data,
+    predict_confidences,
+    simulate,
+)
+
+# Betting policies to sweep, every combination of the values is run
+LINEAR_GRID = {
+    "max_bet_fraction": [0.1, 0.25, 0.5, 0.75],
+}
+RISK_GRID = {
+    "risk_exponent": [2, 3, 4, 6, 8],
+    "max_bet_fraction": [None, 0.1, 0.25, 0.5, 1.0],
+    "is_tournament": [False, True],
+}
+
+SUMMARY_FIELDS = [
+    "policy",
+    "max_bet_fraction",
+    "risk_exponent",
+    "is_tournament",
+    "seed",
+    "mean_balance",
+    "max_balance",
+    "final_balance",
+    "max_drawdown",
+]
+
+# Match data shared with the workers, filled by `_init_worker`
+_shared = {}
+
+
+def build_jobs(seeds):
+    """
+    Expand the policy grids into (policy, params, seed) jobs.
+    """
+    jobs = []
+    for policy, grid in (("linear", LINEAR_GRID), ("risk", RISK_GRID)):
+        keys = list(grid)
+        for values in itertools.product(*grid.values()):
+            for seed in seeds:
+                jobs.append((policy, dict(zip(keys, values)), seed))
+
+    return jobs
+
+
+def share_arrays(arrays):
+    """
+    Copy arrays into shared memory blocks.
+
+    Returns
+    -------
+    blocks : list[shared_memory.SharedMemory]
+        The blocks, must be kept alive and unlinked by the caller.
+    specs : dict[str, tuple[str, str, tuple]]
+        Name, dtype and shape of every array, used by the workers to attach.
+    """
+    blocks, specs = [], {}
+    for key, array in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)[:] = array
+        blocks.append(block)
+        specs[key] = (block.name, array.dtype.str, array.shape)
+
+    return blocks, specs
+
+
+def _init_worker(specs):
+    for key, (name, dtype, shape) in specs.items():
+        block = shared_memory.SharedMemory(name=name)
+        _shared[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        _shared[f"_{key}_block"] = block  # Keep the mapping alive
+
+
+def _run_job(job, num_sims):
+    policy, params, seed = job
+
+    if policy == "linear":
+        bet_fn = partial(calculate_bet_amount, **params)
+    else:
+        bet_fn = partial(calculate_risk_bet, **params)
+
+    results = simulate(
+        _shared["conf"],
+        _shared["team"],
+        _shared["winner"],
+        _shared["red_pot"],
+        _shared["blue_pot"],
+        num_sims=num_sims,
+        bet_fn=bet_fn,
+        seed=seed,
+    )
+
+    return {
+        "policy": policy,
+        "max_bet_fraction": params.get("max_bet_fraction"),
+        "risk_exponent": params.get("risk_exponent"),
+        "is_tournament": params.get("is_tournament"),
+        "seed": seed,
+        "mean_balance": float(np.mean(results["mean"])),
+        "max_balance": float(np.max(results["max"])),
+        "final_balance": float(np.mean(results["final"])),
+        "max_drawdown": float(np.mean(results["max_drawdown"])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep betting policies over the match history.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seeds", type=int, default=4, help="Number of seeds per policy.")
+    parser.add_argument("--sims", type=int, default=1000, help="Number of simulations per job.")
+    parser.add_argument("--output", default="sweep_results.csv")
+    args = parser.parse_args()
+
+    # Import lazily so workers never need the model or the settings
+    from app.utils.confidence_matrix import ConfidenceMatrix
+    from app.utils.inference import create_session
+    from app.utils.settings import settings
+
+    match_data = load_match_data()
+    if ConfidenceMatrix.exists(settings.MODEL_DIR):
+        conf, team = ConfidenceMatrix(settings.MODEL_DIR).predict(match_data["red"], match_data["blue"])
+    else:
+        # Batch scoring, use every core
+        model = create_session(settings.MODEL_DIR, intra_op_threads=0)
+        conf, team = predict_confidences(model, match_data["red"], match_data["blue"])
+    match_data, conf, team = drop_unscored(match_data, conf, team)
+
+    blocks, specs = share_arrays({
+        "conf": conf,
+        "team": team,
+        "winner": match_data["winner"],
+        "red_pot": match_data["red_pot"],
+        "blue_pot": match_data["blue_pot"],
+    })
+    del match_data, conf, team
+
+    jobs = build_jobs(range(args.seeds))
+    print(f"Running {len(jobs)} jobs of {args.sims} simulations on {args.workers} workers")
+
+    start = time.time()
+    rows = []
+    try:
+        with open(args.output, "w", newline="") as f, \
+                Pool(args.workers, initializer=_init_worker, initargs=(specs,)) as pool:
+            writer = csv.DictWriter(f, fieldnames=SUMMARY_FIELDS)
+            writer.writeheader()
+
+            # Stream the results to disk as they finish
+            for row in pool.imap_unordered(partial(_run_job, num_sims=args.sims), jobs):
+                writer.writerow(row)
+                f.flush()
+                rows.append(row)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+    print(f"Finished in {time.time() - start:.2f}s, results saved to {args.output}")
+
+    rows.sort(key=lambda r: r["final_balance"], reverse=True)
+    print(" | ".join(f"{field:>16}" for field in SUMMARY_FIELDS))
+    for row in rows[:10]:
+        print(" | ".join(f"{str(row[field]):>16}" for field in SUMMARY_FIELDS))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import argparse
+import os
+import time
+
+import numpy as np
+
+from app.utils.confidence_matrix import DENSE_FILE, PAIRS_FILE, VALUES_FILE, matrix_size
+from app.utils.inference import create_session
+from app.utils.vocab import load_vocab
+
+
+def red_win_probs(model, pairs):
+    """
+    Probability of red winning for every (red, blue) row of `pairs`.
+    """
+    logits = model.run(None, {"input": pairs})[0].astype(np.float64)
+    logits -= logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp[:, 0] / exp.sum(axis=1)
+
+
+def export_dense(model, size, path, batch_size):
+    """
+    Write the full size x size matrix, scoring whole rows of red characters per batch.
+    """
+    matrix = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(size, size))
+    rows_per_batch = max(batch_size // size, 1)
+    blue = np.arange(size, dtype=np.int64)
+
+    for start in range(0, size, rows_per_batch):
+        stop = min(start + rows_per_batch, size)
+        red = np.arange(start, stop, dtype=np.int64)
+        pairs = np.stack(np.meshgrid(red, blue, indexing="ij"), axis=-1).reshape(-1, 2)
+        matrix[start:stop] = red_win_probs(model, pairs).reshape(stop - start, size)
+
+    matrix.flush()
+
+
+def export_observed(model, size, model_dir, batch_size):
+    """
+    Write only the pairs seen in the match history, sorted by their key red * size + blue.
+    """
+    from utils.simulation import load_all_pairs
+
+    red, blue = load_all_pairs()
+    keep = (red < size) & (blue < size)
+    keys = np.unique(red[keep] * size + blue[keep])
+
+    values = np.empty(len(keys), dtype=np.float32)
+    for start in range(0, len(keys), batch_size):
+        chunk = keys[start:start + batch_size]
+        pairs = np.stack([chunk // size, chunk % size], axis=1)
+        values[start:start + batch_size] = red_win_probs(model, pairs)
+
+    np.save(os.path.join(model_dir, PAIRS_FILE), keys)
+    np.save(os.path.join(model_dir, VALUES_FILE), values)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a model's win probability matrix next to model.onnx.")
+    parser.add_argument("model_dir")
+    parser.add_argument("--observed", action="store_true", help="Only export pairs seen in the match history.")
+    parser.add_argument("--batch-size", type=int, default=2 ** 16, help="Pairs scored per ONNX run.")
+    args = parser.parse_args()
+
+    model = create_session(args.model_dir, intra_op_threads=0)
+    size = matrix_size(load_vocab(args.model_dir))
+
+    start = time.time()
+    if args.observed:
+        export_observed(model, size, args.model_dir, args.batch_size)
+    else:
+        export_dense(model, size, os.path.join(args.model_dir, DENSE_FILE), args.batch_size)
+
+    print(f"Exported {'observed' if args.observed else 'dense'} {size}x{size} matrix in {time.time() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
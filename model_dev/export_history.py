@@ -0,0 +1,21 @@
+import argparse
+import time
+
+import app.utils.database as db
+from utils.history import HISTORY_DIR, export_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the match history to memory-mappable columnar files.")
+    parser.add_argument("--path", default=HISTORY_DIR, help="Directory to write the snapshot to.")
+    parser.add_argument("--chunk-size", type=int, default=2 ** 16, help="Rows fetched per round trip.")
+    parser.add_argument("--full", action="store_true", help="Re-export everything instead of appending new matches.")
+    args = parser.parse_args()
+
+    start = time.time()
+    num_rows = export_history(db.get_engine(), args.path, chunk_size=args.chunk_size, incremental=not args.full)
+    print(f"Exported {num_rows} new matches to {args.path} in {time.time() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+import argparse
+import logging
+import time
+
+import sqlalchemy
+
+import app.utils.database as db
+from app.utils.settings import settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Add the integer match columns and indexes, then backfill them.")
+    parser.add_argument("--batch-size", type=int, default=50000, help="Matches updated per transaction.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if settings.PG_DSN is None:
+        parser.error("No database specified, set PG_DSN.")
+
+    # Not db.get_engine(), it refuses to run on an unmigrated database
+    engine = sqlalchemy.create_engine(settings.PG_DSN, echo=False)
+    db.Base.metadata.create_all(engine)
+    db.migrate(engine)
+
+    start = time.time()
+    num_updated = db.backfill(engine, batch_size=args.batch_size)
+    print(f"Backfilled {num_updated} match(es) in {time.time() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import time
+
+import numpy as np
+
+from app.utils.ratings import EloRatings
+from utils.history import load_history
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the match history through the Elo ratings and backtest them.")
+    parser.add_argument("--k", type=float, default=32, help="Largest rating change of a single match.")
+    parser.add_argument("--scale", type=float, default=400, help="Rating difference for 10 to 1 odds.")
+    parser.add_argument("--output", default=None, help="Save the final ratings, e.g. to seed RATINGS_PATH.")
+    args = parser.parse_args()
+
+    columns, vocab = load_history()
+
+    start = time.time()
+    ratings, p_red = EloRatings.from_history(columns, vocab, k=args.k, scale=args.scale)
+    print(f"Replayed {len(p_red)} matches in {time.time() - start:.2f}s")
+
+    # Score the predictions made before each match was played
+    red_won = np.asarray(columns["winner"]) == 0
+    accuracy = np.mean((p_red >= 0.5) == red_won)
+    p_winner = np.clip(np.where(red_won, p_red, 1 - p_red), 1e-12, 1)
+    print(f"Accuracy: {accuracy:.2%}")
+    print(f"Log loss: {-np.mean(np.log(p_winner)):.4f}")
+
+    if args.output:
+        ratings.save(args.output)
+        print(f"Saved the ratings of {len(ratings)} characters to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
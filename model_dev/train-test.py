@@ -1,29 +1,31 @@
-import gc
+import time
 
 import numpy as np
 import torch
 from torch.nn import BCEWithLogitsLoss
-from torch.optim import AdamW
 from tqdm import tqdm
 
 from utils.data import train_loader, num_characters, val_loader
 from utils.model import BetBot
+from utils.training import autocast, get_device, make_optimizers
 
-device = "cuda"
+device = get_device()
 
 
 def main():
     torch.manual_seed(42)
     model = BetBot(num_characters).to(device)
-    optimizer = AdamW(model.parameters())
+    optimizers = make_optimizers(model)
     loss_fn = BCEWithLogitsLoss()
-    scaler = torch.cuda.amp.GradScaler()
+    # Only fp16 needs the loss scaled, bf16 has the range of fp32
+    scaler = torch.cuda.amp.GradScaler(enabled=device == "cuda")
     num_accumulation_steps = 4
 
     for epoch in range(100):
         losses = []
         correct = 0
         count = 0
+        start = time.perf_counter()
 
         model.train()
         with tqdm(train_loader, unit="batch") as tepoch:
@@ -32,7 +34,7 @@ def main():
                 inputs, labels = inputs.to(device), labels.to(device)
 
                 # Automatic Tensor Casting
-                with torch.cuda.amp.autocast():
+                with autocast(device):
                     outputs = model(inputs)
                     loss = loss_fn(outputs, labels)
                 scaler.scale(loss).backward()  # Automatic Gradient Scaling
@@ -43,13 +45,10 @@ def main():
 
                 # Gradient Accumulation
                 if ((idx + 1) % num_accumulation_steps == 0) or (idx + 1 == len(train_loader)):
-                    scaler.step(optimizer)
+                    for optimizer in optimizers:
+                        scaler.step(optimizer)
+                        optimizer.zero_grad()
                     scaler.update()
-                    optimizer.zero_grad()
-
-                # Garbage Collection
-                torch.cuda.empty_cache()
-                _ = gc.collect()
 
                 # Calculate Accuracy
                 count += inputs.shape[0]
@@ -59,6 +58,7 @@ def main():
                 tepoch.set_postfix(
                     loss=np.mean(losses),
                     accuracy=f"{correct / count:.2%}",
+                    samples_per_sec=f"{count / (time.perf_counter() - start):,.0f}",
                 )
 
                 if idx + 1 == len(train_loader):
@@ -71,8 +71,8 @@ def main():
                     model.eval()
                     for idx, (inputs, labels) in enumerate(val_loader):
                         inputs, labels = inputs.to(device), labels.to(device)
-                        outputs = model(inputs)
                         with torch.no_grad():
+                            outputs = model(inputs)
                             loss = loss_fn(outputs, labels)
                         val_losses.append(loss.item())
 
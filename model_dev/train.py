@@ -1,4 +1,4 @@
-import gc
+import argparse
 import json
 import os
 import time
@@ -6,38 +6,62 @@ import time
 import numpy as np
 import torch
 from torch.nn import CrossEntropyLoss
-from torch.optim import AdamW
 from tqdm import tqdm
 
-from utils.data import production_loader, num_characters
-from utils.model import BetBot
+from app.utils.vocab import write_vocab
+from utils.data import production_loader, num_characters, test_loader, train_loader, vocab
+from utils.model import BetBot, MonteCarloBetBot, to_deterministic
+from utils.quantize import QUANTIZATION_MODES, compare, print_report, quantize
+from utils.training import autocast, get_device, make_optimizers, set_threads
 
-device = "cuda" if torch.cuda.is_available() else "cpu"
+device = get_device()
 print(f"Using device: {device}")
 
 
 def main():
-    model = BetBot(num_characters).to(device)
-    optimizer = AdamW(model.parameters())
+    parser = argparse.ArgumentParser(description="Train the model on the whole match history and export it.")
+    parser.add_argument("--quantize", choices=QUANTIZATION_MODES, default=None,
+                        help="Also export a compressed model, shipped if it is about as accurate on the test split. "
+                             "The model is then trained on the train split only, so the test split stays unseen.")
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.002,
+                        help="Largest accuracy loss on the test split for the compressed model to be shipped.")
+    parser.add_argument("--mc-samples", type=int, default=0,
+                        help="Also export model.mc.onnx, returning the mean and variance over this many weight samples.")
+    parser.add_argument("--epochs", type=int, default=100)
+    parser.add_argument("--threads", type=int, default=None, help="Threads used inside an operator.")
+    parser.add_argument("--interop-threads", type=int, default=None, help="Threads used across operators.")
+    parser.add_argument("--no-amp", action="store_true", help="Train in fp32 instead of bf16 (CPU) or fp16 (GPU).")
+    parser.add_argument("--sparse", action="store_true",
+                        help="Sparse embedding gradients with SparseAdam. Experimental: unlike AdamW it applies no "
+                             "weight decay to the embeddings and updates their moments lazily.")
+    args = parser.parse_args()
+
+    # The quantization gate needs matches the model never saw
+    loader = train_loader if args.quantize else production_loader
+
+    set_threads(args.threads, args.interop_threads)
+
+    model = BetBot(num_characters, sparse=args.sparse).to(device)
+    optimizers = make_optimizers(model)
     loss_fn = CrossEntropyLoss()
-    scaler = torch.cuda.amp.GradScaler()
+    # Only fp16 needs the loss scaled, bf16 has the range of fp32
+    scaler = torch.cuda.amp.GradScaler(enabled=device == "cuda" and not args.no_amp)
     num_accumulation_steps = 4
 
-    epochs = 100
-
-    for epoch in range(epochs):
+    for epoch in range(args.epochs):
         losses = []
         correct = 0
         count = 0
+        start = time.perf_counter()
 
         model.train()
-        with tqdm(production_loader, unit="batch") as tepoch:
+        with tqdm(loader, unit="batch") as tepoch:
             tepoch.set_description(f"Epoch {epoch}")
             for idx, (inputs, labels) in enumerate(tepoch):
                 inputs, labels = inputs.to(device), labels.to(device)
 
                 # Automatic Tensor Casting
-                with torch.cuda.amp.autocast():
+                with autocast(device, enabled=not args.no_amp):
                     outputs = model(inputs)
                     loss = loss_fn(outputs, labels)
                 scaler.scale(loss).backward()  # Automatic Gradient Scaling
@@ -47,14 +71,11 @@ def main():
                 losses.append(loss.item())
 
                 # Gradient Accumulation
-                if ((idx + 1) % num_accumulation_steps == 0) or (idx + 1 == len(production_loader)):
-                    scaler.step(optimizer)
+                if ((idx + 1) % num_accumulation_steps == 0) or (idx + 1 == len(loader)):
+                    for optimizer in optimizers:
+                        scaler.step(optimizer)
+                        optimizer.zero_grad()
                     scaler.update()
-                    optimizer.zero_grad()
-
-                # Garbage Collection
-                torch.cuda.empty_cache()
-                _ = gc.collect()
 
                 # Calculate Accuracy
                 count += inputs.shape[0]
@@ -64,18 +85,21 @@ def main():
                 tepoch.set_postfix(
                     loss=np.mean(losses),
                     accuracy=f"{correct / count:.2%}",
+                    samples_per_sec=f"{count / (time.perf_counter() - start):,.0f}",
                 )
 
     dir_name = time.strftime("%Y.%m.%d-%H.%M")
-    dir_path = os.path.abspath(os.path.dirname(__file__))
-    dir_path = os.path.join(dir_path, "..", "app", "models", dir_name)
+    models_dir = os.path.join(os.path.abspath(os.path.dirname(__file__)), "..", "app", "models")
+    # Write to a hidden directory first, so a watching bot never loads a half written model
+    dir_path = os.path.join(models_dir, f".{dir_name}")
     os.makedirs(dir_path, exist_ok=True)
-    print(f"Saving model to {dir_path}")
+    print(f"Saving model to {os.path.join(models_dir, dir_name)}")
 
-    # Save the model
+    # Save the model, with the posterior mean weights so predictions are deterministic
+    model = model.eval().cpu()
     file_name = os.path.join(dir_path, "model.onnx")
     torch.onnx.export(
-        model.eval().cpu(),  # model being run
+        to_deterministic(model),  # model being run
         torch.tensor([[0, 0]]),  # model input (or a tuple for multiple inputs)
         file_name,  # where to save the model
         export_params=True,  # store the trained parameter weights inside the model file
@@ -85,10 +109,47 @@ def main():
         dynamic_axes={'input': {0: 'batch_size'}, 'output': {0: 'batch_size'}}  # variable length axes
     )
 
+    # Save the Monte Carlo model, the probabilities' mean and variance over many weight samples in one call
+    if args.mc_samples > 0:
+        torch.onnx.export(
+            MonteCarloBetBot(model, num_samples=args.mc_samples),
+            torch.tensor([[0, 0]]),
+            os.path.join(dir_path, "model.mc.onnx"),
+            export_params=True,
+            do_constant_folding=True,
+            input_names=['input'],
+            output_names=['mean', 'variance'],
+            dynamic_axes={'input': {0: 'batch_size'}, 'mean': {0: 'batch_size'}, 'variance': {0: 'batch_size'}},
+        )
+
     # Save the "vocab" file for the characters the model was trained on
     file_name = os.path.join(dir_path, "vocab.json")
     with open(file_name, "w") as f:
-        json.dump(production_loader.dataset.vocab, f)
+        json.dump(vocab, f)
+
+    # And its compact, memory-mappable version the bot loads
+    write_vocab(vocab, os.path.join(dir_path, "vocab.bin"))
+
+    if args.quantize:
+        model_path = os.path.join(dir_path, "model.onnx")
+        quantized_path = os.path.join(dir_path, f"model.{args.quantize}.onnx")
+        quantize(model_path, quantized_path, args.quantize)
+
+        report = compare(model_path, quantized_path, test_loader)
+        print_report(report)
+        with open(os.path.join(dir_path, "quantization.json"), "w") as f:
+            json.dump({"mode": args.quantize, **report}, f, indent=2)
+
+        # Ship the compressed model as model.onnx, keeping the original next to it
+        accuracy_drop = report["fp32"]["accuracy"] - report["quantized"]["accuracy"]
+        if accuracy_drop <= args.max_accuracy_drop:
+            print(f"Accuracy dropped by {accuracy_drop:.2%}, shipping the {args.quantize} model")
+            os.replace(model_path, os.path.join(dir_path, "model.fp32.onnx"))
+            os.replace(quantized_path, model_path)
+        else:
+            print(f"Accuracy dropped by {accuracy_drop:.2%}, shipping the fp32 model")
+
+    os.replace(dir_path, os.path.join(models_dir, dir_name))
 
 
 if __name__ == '__main__':
@@ -1,37 +1,17 @@
+import numpy as np
 import torch
-from sqlalchemy.orm import Session, aliased
-from torch.utils.data import DataLoader, Dataset, random_split
+from torch.utils.data import Dataset, random_split
 
-import app.utils.database as db
+from utils.history import load_history
 
 
 class SaltybetDataset(Dataset):
     def __init__(self):
-        # Get the Data from the Database
-        with Session(db.engine) as session:
-            red = aliased(db.Character)
-            blue = aliased(db.Character)
-
-            match_data = session.query(
-                red.id,
-                blue.id,
-                db.Match.winner
-            ).where(
-                db.Match.red == red.name
-            ).where(
-                db.Match.blue == blue.name
-            ).all()
-
-            self.vocab = {name: _id for _id, name in session.query(db.Character.id, db.Character.name).all()}
-
-        self.x, self.y = [], []
-        for r, b, w in match_data:
-            self.x.append([r, b])
-            self.y.append([1, 0] if w == 'red' else [0, 1])
-        self.x = torch.LongTensor(self.x)
-        self.y = torch.Tensor(self.y)
-
-        del match_data, red, blue
+        # Memory-map the exported match history, see export_history.py
+        columns, self.vocab = load_history()
+
+        self.x = torch.from_numpy(np.stack([columns["red"], columns["blue"]], axis=1).astype(np.int64))
+        self.y = torch.from_numpy(np.eye(2, dtype=np.float32)[columns["winner"]])
 
     def __len__(self):
         return len(self.x)
@@ -40,16 +20,56 @@ class SaltybetDataset(Dataset):
         return self.x[idx], self.y[idx]
 
 
+class BatchLoader:
+    """
+    Yields whole batches by slicing the dataset tensors, instead of collating `batch_size` items one by one like
+    a `DataLoader`.
+
+    Parameters
+    ----------
+    dataset : SaltybetDataset or torch.utils.data.Subset
+        The data, a subset is sliced through its indices.
+    batch_size : int
+        Number of samples per batch.
+    shuffle : bool, default=False
+        Shuffle the samples every epoch.
+    """
+
+    def __init__(self, dataset, batch_size, shuffle=False):
+        if hasattr(dataset, "indices"):
+            indices = torch.as_tensor(dataset.indices, dtype=torch.int64)
+            self.x, self.y = dataset.dataset.x[indices], dataset.dataset.y[indices]
+        else:
+            self.x, self.y = dataset.x, dataset.y
+
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+
+    def __len__(self):
+        return (len(self.x) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        if self.shuffle:
+            order = torch.randperm(len(self.x))
+            x, y = self.x[order], self.y[order]
+        else:
+            x, y = self.x, self.y
+
+        for start in range(0, len(x), self.batch_size):
+            yield x[start:start + self.batch_size], y[start:start + self.batch_size]
+
+
 dataset = SaltybetDataset()
 vocab = dataset.vocab
-num_characters = len(vocab)
+# The ids are the database ids, which have gaps, so the embeddings go up to the largest one
+num_characters = max(vocab.values(), default=0)
 
 train, val, test = random_split(dataset, [0.7, 0.1, 0.2], torch.Generator().manual_seed(42))
 
 batch_size = 2 ** 10
-production_loader = DataLoader(dataset, batch_size=batch_size, shuffle=True)
-train_loader = DataLoader(train, batch_size=batch_size, shuffle=True)
-val_loader = DataLoader(val, batch_size=batch_size)
-test_loader = DataLoader(test, batch_size=batch_size)
+production_loader = BatchLoader(dataset, batch_size=batch_size, shuffle=True)
+train_loader = BatchLoader(train, batch_size=batch_size, shuffle=True)
+val_loader = BatchLoader(val, batch_size=batch_size)
+test_loader = BatchLoader(test, batch_size=batch_size)
 
 del dataset
@@ -0,0 +1,207 @@
+import json
+import logging
+import os
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+HISTORY_DIR = os.environ.get(
+    "HISTORY_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "history"),
+)
+FORMAT_VERSION = 1
+
+# Column name -> dtype, each stored as a raw little-endian file <name>.bin
+COLUMNS = {
+    "match_id": "<i8",
+    "red": "<i4",
+    "blue": "<i4",
+    "winner": "i1",  # 0 for red, 1 for blue
+    "red_pot": "<i8",  # 0 when the match has no recorded pots
+    "blue_pot": "<i8",
+}
+
+
+def _column_path(path, name):
+    return os.path.join(path, f"{name}.bin")
+
+
+def _write_json(file_name, data):
+    # Write then rename so readers never see a partial file
+    with open(f"{file_name}.tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(f"{file_name}.tmp", file_name)
+
+
+def _read_meta(path):
+    meta_path = os.path.join(path, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def _select_exported(db, *columns):
+    """
+    Select `columns` over the rows an export writes: finished matches with their character ids filled in.
+    """
+    return select(*columns).select_from(db.Match).outerjoin(
+        db.MatchMetadata, db.Match.id == db.MatchMetadata.match_id
+    ).where(
+        db.Match.red_id.is_not(None)
+    ).where(
+        db.Match.winner_code.is_not(None)
+    )
+
+
+def export_history(engine, path=HISTORY_DIR, chunk_size=2 ** 16, incremental=True):
+    """
+    Stream the match history out of Postgres into columnar files.
+
+    Rows are fetched with a server-side cursor and appended chunk by chunk, so memory use is bounded by
+    `chunk_size` no matter how many matches there are.
+
+    When a snapshot already exists at `path` and `incremental` is set, only matches with an id above the
+    snapshot's ``last_match_id`` are fetched and appended to the existing files, and only characters with an id
+    above the largest known one are added to the vocab. The metadata is rewritten last, so an interrupted export
+    leaves the previous snapshot readable and the next export picks up where it left off. If matches at or below
+    ``last_match_id`` became exportable since (e.g. keyed by `app.utils.database.backfill`), the snapshot is
+    exported again from scratch.
+
+    Parameters
+    ----------
+    engine : sqlalchemy.Engine
+        Database to export.
+    path : str, default=HISTORY_DIR
+        Directory to write the snapshot to.
+    chunk_size : int, default=2**16
+        Number of rows fetched and written at a time.
+    incremental : bool, default=True
+        Append to an existing snapshot instead of replacing it.
+
+    Returns
+    -------
+    int
+        Number of matches exported by this call.
+    """
+    import app.utils.database as db
+
+    os.makedirs(path, exist_ok=True)
+
+    meta = _read_meta(path) if incremental else None
+    if meta is not None and (meta["version"] != FORMAT_VERSION or meta["columns"] != COLUMNS):
+        meta = None  # Incompatible snapshot, start over
+
+    if meta is not None:
+        # The id watermark misses rows keyed after they were passed, count them to catch a backfill
+        with Session(engine) as session:
+            num_exported = session.scalar(
+                _select_exported(db, func.count()).where(db.Match.id <= meta["last_match_id"])
+            )
+        if num_exported != meta["num_rows"]:
+            logging.info(f"{num_exported - meta['num_rows']} match(es) up to id {meta['last_match_id']} changed "
+                         f"since the last export, exporting the whole history again")
+            meta = None
+
+    if meta is None:
+        num_rows, last_match_id, vocab = 0, 0, {}
+    else:
+        num_rows, last_match_id = meta["num_rows"], meta["last_match_id"]
+        with open(os.path.join(path, "vocab.json")) as f:
+            vocab = json.load(f)
+
+    files = {}
+    for name, dtype in COLUMNS.items():
+        f = open(_column_path(path, name), "r+b" if meta is not None else "wb")
+        # Drop anything past the last committed row, left over from an interrupted export
+        f.truncate(num_rows * np.dtype(dtype).itemsize)
+        f.seek(0, os.SEEK_END)
+        files[name] = f
+
+    start_rows = num_rows
+    try:
+        with Session(engine) as session:
+            query = _select_exported(
+                db,
+                db.Match.id,
+                db.Match.red_id,
+                db.Match.blue_id,
+                db.Match.winner_code,
+                db.MatchMetadata.red_pot,
+                db.MatchMetadata.blue_pot,
+            ).where(
+                db.Match.id > last_match_id
+            ).order_by(
+                db.Match.id
+            ).execution_options(yield_per=chunk_size)
+
+            for rows in session.execute(query).partitions():
+                columns = dict(zip(COLUMNS, zip(*rows)))
+                for name, dtype in COLUMNS.items():
+                    values = [0 if value is None else value for value in columns[name]]
+                    files[name].write(np.array(values, dtype=dtype).tobytes())
+
+                num_rows += len(rows)
+                last_match_id = rows[-1][0]
+
+            # Character ids only ever grow, so the new characters are the ones past the largest known id
+            last_character_id = max(vocab.values(), default=0)
+            vocab.update({
+                name: _id for _id, name in session.execute(
+                    select(db.Character.id, db.Character.name).where(db.Character.id > last_character_id)
+                )
+            })
+    finally:
+        for f in files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+    _write_json(os.path.join(path, "vocab.json"), vocab)
+    _write_json(os.path.join(path, "meta.json"), {
+        "version": FORMAT_VERSION,
+        "num_rows": num_rows,
+        "last_match_id": last_match_id,
+        "columns": COLUMNS,
+    })
+
+    return num_rows - start_rows
+
+
+def load_history(path=HISTORY_DIR):
+    """
+    Memory-map a snapshot written by `export_history`.
+
+    Parameters
+    ----------
+    path : str, default=HISTORY_DIR
+        Directory of the snapshot.
+
+    Returns
+    -------
+    columns : dict[str, np.ndarray]
+        Read-only memory-mapped columns, see `COLUMNS`.
+    vocab : dict[str, int]
+        Character name to id.
+    """
+    meta = _read_meta(path)
+    if meta is None:
+        raise FileNotFoundError(f"No match history at {path}, run model_dev/export_history.py first")
+
+    if meta["version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported match history version {meta['version']}, re-run the export")
+
+    num_rows = meta["num_rows"]
+    columns = {}
+    for name, dtype in meta["columns"].items():
+        if num_rows == 0:
+            columns[name] = np.empty(0, dtype=dtype)
+        else:
+            columns[name] = np.memmap(_column_path(path, name), dtype=dtype, mode="r", shape=(num_rows,))
+
+    with open(os.path.join(path, "vocab.json")) as f:
+        vocab = json.load(f)
+
+    return columns, vocab
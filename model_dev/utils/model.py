@@ -1,10 +1,13 @@
+import copy
 from datetime import datetime
 
+import torch
 from torch.nn import (
     Module,
     Embedding,
     Sequential,
     Flatten,
+    Linear,
 )
 
 import torchbnn as bnn
@@ -13,14 +16,16 @@ time_stamp = datetime.now().strftime('%m-%d_%H-%M-%S')
 
 
 class BetBot(Module):
-    def __init__(self, num_characters, *args, **kwargs):
+    def __init__(self, num_characters, *args, sparse=False, **kwargs):
         super().__init__(*args, **kwargs)
 
         e_dim = 1024
 
+        # Sparse gradients only touch the rows of the characters in the batch, see utils.training.make_optimizers
         self.embeddings = Embedding(
             num_embeddings=num_characters + 1,
             embedding_dim=e_dim,
+            sparse=sparse,
         )
 
         # Set up a bayesian network for the logits
@@ -38,3 +43,65 @@ class BetBot(Module):
         x = self.embeddings(x)
         x = self.logits(x)
         return x
+
+
+def _replace_bayes_linear(module):
+    for name, child in module.named_children():
+        if isinstance(child, bnn.BayesLinear):
+            linear = Linear(child.in_features, child.out_features, bias=child.bias)
+            with torch.no_grad():
+                linear.weight.copy_(child.weight_mu)
+                if child.bias:
+                    linear.bias.copy_(child.bias_mu)
+            setattr(module, name, linear)
+        else:
+            _replace_bayes_linear(child)
+
+
+def to_deterministic(model):
+    """
+    Copy of a model with every `BayesLinear` folded into a plain `Linear` holding its posterior mean.
+
+    The exported graph then has no sampling ops, so the same match up always gets the same prediction.
+    """
+    model = copy.deepcopy(model)
+    _replace_bayes_linear(model)
+    return model
+
+
+class MonteCarloBetBot(Module):
+    """
+    Runs `num_samples` weight samples of a trained `BetBot` as one batched call.
+
+    Returns the mean and variance of the win probabilities over the samples, so the uncertainty of a prediction
+    costs a single model run.
+
+    Parameters
+    ----------
+    model : BetBot
+        The trained model.
+    num_samples : int, default=32
+        Number of weight samples.
+    """
+
+    def __init__(self, model, num_samples=32):
+        super().__init__()
+
+        self.embeddings = model.embeddings
+        self.flatten, self.bayes = model.logits
+        self.num_samples = num_samples
+
+    def forward(self, x):
+        x = self.flatten(self.embeddings(x))
+
+        # Sample every weight at once, (samples, out, in)
+        shape = (self.num_samples, *self.bayes.weight_mu.shape)
+        weight = self.bayes.weight_mu + torch.exp(self.bayes.weight_log_sigma) * torch.randn(shape)
+        logits = torch.einsum("bi,soi->sbo", x, weight)
+
+        if self.bayes.bias:
+            shape = (self.num_samples, 1, *self.bayes.bias_mu.shape)
+            logits = logits + self.bayes.bias_mu + torch.exp(self.bayes.bias_log_sigma) * torch.randn(shape)
+
+        probs = torch.softmax(logits, dim=-1)
+        return probs.mean(dim=0), probs.var(dim=0)
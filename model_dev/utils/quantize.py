@@ -0,0 +1,156 @@
+import os
+import time
+
+import numpy as np
+
+QUANTIZATION_MODES = ("int8", "fp16")
+
+
+def quantize_int8(model_path, output_path):
+    """
+    Dynamic INT8 quantization of the weights of the embedding (Gather) and linear (MatMul) layers.
+
+    Activations stay in fp32 and are quantized on the fly, so no calibration data is needed.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(
+        model_path,
+        output_path,
+        op_types_to_quantize=["Gather", "MatMul"],
+        weight_type=QuantType.QInt8,
+    )
+
+
+def convert_embeddings_fp16(model_path, output_path):
+    """
+    Store the embedding tables in fp16, halving the size of the model.
+
+    Every Gather reading from an fp32 initializer reads from its fp16 copy instead, followed by a Cast back to
+    fp32, so the rest of the graph is untouched.
+    """
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    model = onnx.load(model_path)
+    graph = model.graph
+    initializers = {init.name: init for init in graph.initializer}
+
+    nodes = []
+    for node in graph.node:
+        table = initializers.get(node.input[0]) if node.op_type == "Gather" else None
+        if table is None or table.data_type != TensorProto.FLOAT:
+            nodes.append(node)
+            continue
+
+        table.CopyFrom(numpy_helper.from_array(numpy_helper.to_array(table).astype(np.float16), table.name))
+
+        output = node.output[0]
+        node.output[0] = f"{output}_fp16"
+        nodes.append(node)
+        nodes.append(helper.make_node("Cast", [node.output[0]], [output], to=TensorProto.FLOAT))
+
+    del graph.node[:]
+    graph.node.extend(nodes)
+    onnx.checker.check_model(model)
+    onnx.save(model, output_path)
+
+
+def quantize(model_path, output_path, mode):
+    """
+    Write a compressed copy of a model.
+
+    Parameters
+    ----------
+    model_path : str
+        The fp32 model.
+    output_path : str
+        File to write the compressed model to.
+    mode : str
+        "int8" for `quantize_int8` or "fp16" for `convert_embeddings_fp16`.
+    """
+    if mode == "int8":
+        quantize_int8(model_path, output_path)
+    elif mode == "fp16":
+        convert_embeddings_fp16(model_path, output_path)
+    else:
+        raise ValueError(f"Unknown quantization mode: {mode}")
+
+
+def evaluate(model_path, loader, num_latency_runs=1000):
+    """
+    Accuracy, log loss, size and single-call latency of a model.
+
+    Parameters
+    ----------
+    model_path : str
+        The ONNX model.
+    loader : Iterable
+        Batches of (inputs, one-hot labels), e.g. ``utils.data.test_loader``.
+    num_latency_runs : int, default=1000
+        Number of single match ups timed.
+
+    Returns
+    -------
+    dict[str, float]
+        ``accuracy``, ``log_loss``, ``size_mb``, ``p50_us`` and ``p99_us``.
+    """
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = 1
+    session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+
+    correct, count, log_loss = 0, 0, 0.0
+    for inputs, labels in loader:
+        logits = session.run(None, {"input": inputs.numpy()})[0].astype(np.float64)
+        logits -= logits.max(axis=1, keepdims=True)
+        log_probs = logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+        truth = labels.numpy().argmax(axis=1)
+
+        correct += int(np.sum(log_probs.argmax(axis=1) == truth))
+        log_loss -= float(log_probs[np.arange(len(truth)), truth].sum())
+        count += len(truth)
+
+    pair = np.zeros((1, 2), dtype=np.int64)
+    for _ in range(10):
+        session.run(None, {"input": pair})
+    latencies = []
+    for _ in range(num_latency_runs):
+        start = time.perf_counter()
+        session.run(None, {"input": pair})
+        latencies.append(time.perf_counter() - start)
+    p50, p99 = np.percentile(np.array(latencies) * 1e6, [50, 99])
+
+    return {
+        "accuracy": correct / max(count, 1),
+        "log_loss": log_loss / max(count, 1),
+        "size_mb": os.path.getsize(model_path) / 2 ** 20,
+        "p50_us": float(p50),
+        "p99_us": float(p99),
+    }
+
+
+def compare(model_path, quantized_path, loader):
+    """
+    Evaluate a model and its compressed copy on the same data, see `evaluate`.
+
+    Returns
+    -------
+    dict[str, dict[str, float]]
+        The evaluation of the ``fp32`` and ``quantized`` models.
+    """
+    return {
+        "fp32": evaluate(model_path, loader),
+        "quantized": evaluate(quantized_path, loader),
+    }
+
+
+def print_report(report):
+    """
+    Print the results of `compare` side by side.
+    """
+    fp32, quantized = report["fp32"], report["quantized"]
+    print(f"{'':>10} | {'fp32':>10} | {'quantized':>10}")
+    for key in fp32:
+        print(f"{key:>10} | {fp32[key]:>10.4f} | {quantized[key]:>10.4f}")
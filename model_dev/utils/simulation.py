@@ -0,0 +1,288 @@
+import numpy as np
+
+from utils.history import load_history
+
+# Same encoding as app.utils.database.WINNER_CODES
+RED = 0
+BLUE = 1
+
+
+def load_match_data():
+    """
+    Load every match that has recorded pots from the exported match history.
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Columns ``red``, ``blue`` (character ids), ``winner`` (0 for red, 1 for blue), ``red_pot`` and ``blue_pot``.
+    """
+    columns, _ = load_history()
+    has_pots = (columns["red_pot"] > 0) & (columns["blue_pot"] > 0)
+
+    return {
+        "red": columns["red"][has_pots].astype(np.int64),
+        "blue": columns["blue"][has_pots].astype(np.int64),
+        "winner": columns["winner"][has_pots],
+        "red_pot": columns["red_pot"][has_pots].astype(np.float64),
+        "blue_pot": columns["blue_pot"][has_pots].astype(np.float64),
+    }
+
+
+def load_all_pairs():
+    """
+    Load the character ids of every match up in the exported match history, with or without pots.
+
+    Returns
+    -------
+    red : np.ndarray
+        Character ids of the red team.
+    blue : np.ndarray
+        Character ids of the blue team.
+    """
+    columns, _ = load_history()
+    return columns["red"].astype(np.int64), columns["blue"].astype(np.int64)
+
+
+def drop_unscored(match_data, conf, team):
+    """
+    Drop the matches without a prediction (confidence -1, e.g. pairs missing from a sparse confidence matrix).
+
+    Returns
+    -------
+    match_data : dict[str, np.ndarray]
+        The scored matches, see `load_match_data`.
+    conf : np.ndarray
+        Their confidences.
+    team : np.ndarray
+        Their predicted winners.
+    """
+    scored = conf >= 0
+    if scored.all():
+        return match_data, conf, team
+
+    print(f"Skipping {np.sum(~scored)} of {len(conf)} matches without a prediction")
+    return {key: value[scored] for key, value in match_data.items()}, conf[scored], team[scored]
+
+
+def predict_confidences(model, red, blue, batch_size=2 ** 14):
+    """
+    Score every (red, blue) pair with batched ONNX calls.
+
+    Each distinct pair is only run through the model once, the results are then broadcast back to every match.
+
+    Parameters
+    ----------
+    model : onnxruntime.InferenceSession
+        The exported model. Its input must have a dynamic batch axis.
+    red : np.ndarray
+        Character ids of the red team.
+    blue : np.ndarray
+        Character ids of the blue team.
+    batch_size : int, default=2**14
+        Number of pairs to score per ``model.run`` call.
+
+    Returns
+    -------
+    conf : np.ndarray
+        Confidence of the prediction for every match.
+    team : np.ndarray
+        Predicted winner for every match, 0 for red and 1 for blue.
+    """
+    pairs = np.stack([red, blue], axis=1).astype(np.int64)
+    unique_pairs, inverse = np.unique(pairs, axis=0, return_inverse=True)
+
+    probs = np.empty((len(unique_pairs), 2), dtype=np.float64)
+    for start in range(0, len(unique_pairs), batch_size):
+        logits = model.run(None, {"input": unique_pairs[start:start + batch_size]})[0].astype(np.float64)
+
+        # Softmax the output
+        logits -= logits.max(axis=1, keepdims=True)
+        exp = np.exp(logits)
+        probs[start:start + batch_size] = exp / exp.sum(axis=1, keepdims=True)
+
+    team = np.argmax(probs, axis=1).astype(np.int8)
+    conf = probs[np.arange(len(probs)), team]
+
+    inverse = inverse.reshape(-1)
+    return conf[inverse], team[inverse]
+
+
+def calculate_bet_amount(balance, confidence, max_bet_fraction=0.5):
+    """
+    Calculate the bet for each simulation.
+
+    Parameters
+    ----------
+    balance : np.ndarray
+        Current balance of each simulation.
+    confidence : np.ndarray
+        Confidence in the prediction of each simulation.
+    max_bet_fraction : float, default=0.5
+        Maximum bet as a fraction of the balance.
+
+    Returns
+    -------
+    np.ndarray
+        The amount to bet for each simulation.
+    """
+    max_bet = max_bet_fraction * balance
+
+    # Calculate the optimal bet size based on the confidence level
+    bet = np.round(max_bet * (2 * confidence - 1))
+
+    # Make sure the bet is within our balance limits
+    bet = np.minimum(bet, max_bet)  # don't bet more than we have or can afford
+    bet = np.maximum(bet, 750 - balance)  # don't bet less than what we need to reach the minimum balance
+
+    return bet
+
+
+def calculate_risk_bet(balance, confidence, is_tournament=False, risk_exponent=None, max_bet_fraction=None):
+    """
+    Vectorized version of `app.utils.helper_functions.calculate_bet` with tunable constants.
+
+    Parameters
+    ----------
+    balance : np.ndarray
+        Current balance of each simulation.
+    confidence : np.ndarray
+        Confidence in the prediction of each simulation.
+    is_tournament : bool, default=False
+        Whether to use the tournament policy.
+    risk_exponent : float, default=None
+        Exponent of the risk curve. Defaults to 3 for tournaments and 6 otherwise.
+    max_bet_fraction : float, default=None
+        Maximum bet as a fraction of the balance. Defaults to the live bot's limits.
+
+    Returns
+    -------
+    np.ndarray
+        The amount to bet for each simulation.
+    """
+    if is_tournament:
+        min_bet = 1250
+        risk = np.exp((risk_exponent or 3) * (confidence - 1))
+        max_proportion = 1 if max_bet_fraction is None else max_bet_fraction
+
+    else:
+        min_bet = 750
+        risk = np.exp((risk_exponent or 6) * (confidence - 1)) / 1.5
+        max_proportion = 1 / (balance / 1000) if max_bet_fraction is None else max_bet_fraction
+
+    # Calculate the bet amount as a percentage of the balance
+    bet = np.round(balance * risk)
+
+    # Limit the bet amount to the maximum proportion of the balance we want to bet
+    bet = np.minimum(bet, np.round(balance * max_proportion))
+
+    # Limit the bet amount to the available balance and the minimum bet amount
+    bet = np.maximum(bet, min_bet)
+    bet = np.minimum(bet, balance)
+
+    return bet
+
+
+def simulate(
+        conf,
+        team,
+        winner,
+        red_pot,
+        blue_pot,
+        num_sims=100,
+        initial_balance=750,
+        bet_fn=calculate_bet_amount,
+        chunk_size=1024,
+        seed=None,
+        return_history=False,
+):
+    """
+    Replay the match history in ``num_sims`` random orders at once.
+
+    Every simulation advances one match per step, so the balances of all simulations in a chunk are updated with a
+    handful of NumPy operations instead of a Python loop per simulation.
+
+    Parameters
+    ----------
+    conf : np.ndarray
+        Confidence of the prediction for every match, see `predict_confidences`.
+    team : np.ndarray
+        Predicted winner for every match, 0 for red and 1 for blue.
+    winner : np.ndarray
+        Actual winner for every match, 0 for red and 1 for blue.
+    red_pot : np.ndarray
+        Amount in the red pot for every match.
+    blue_pot : np.ndarray
+        Amount in the blue pot for every match.
+    num_sims : int, default=100
+        Number of shuffled replays to run.
+    initial_balance : int, default=750
+        Starting balance, also the balance we get reset to when going bust.
+    bet_fn : callable, default=calculate_bet_amount
+        Vectorized ``bet_fn(balance, confidence)`` returning the bet of each simulation.
+    chunk_size : int, default=1024
+        Number of simulations run together, bounds the memory used by the shuffled orders.
+    seed : int, default=None
+        Seed for the shuffles.
+    return_history : bool, default=False
+        Whether to also return the balance after every match, an array of shape (num_sims, num_matches).
+
+    Returns
+    -------
+    dict[str, np.ndarray]
+        Per simulation ``mean``, ``max`` and ``final`` balance as well as the ``max_drawdown`` (largest fraction of
+        a previous peak that was lost). Includes ``history`` if requested.
+    """
+    rng = np.random.default_rng(seed)
+    num_matches = len(conf)
+
+    results = {key: np.empty(num_sims) for key in ("mean", "max", "final", "max_drawdown")}
+    if return_history:
+        results["history"] = np.empty((num_sims, num_matches))
+
+    for start in range(0, num_sims, chunk_size):
+        stop = min(start + chunk_size, num_sims)
+        n = stop - start
+
+        # Row t holds the match every simulation plays at step t
+        order = np.argsort(rng.random((num_matches, n)), axis=0)
+
+        balance = np.full(n, float(initial_balance))
+        peak = balance.copy()
+        total = np.zeros(n)
+        drawdown = np.zeros(n)
+
+        for t in range(num_matches):
+            idx = order[t]
+            c = conf[idx]
+            bet_on_red = team[idx] == RED
+
+            bet = bet_fn(balance, c)
+
+            # add bet amount to team pot
+            red = red_pot[idx] + np.where(bet_on_red, bet, 0)
+            blue = blue_pot[idx] + np.where(bet_on_red, 0, bet)
+
+            # calc return of the popular and upset side
+            ratio = np.maximum(red, blue) / np.minimum(red, blue)
+            popular = np.where(red >= blue, RED, BLUE)
+            winnings = np.where(team[idx] == popular, bet / ratio, bet * ratio)
+
+            correct = team[idx] == winner[idx]
+            balance = balance + np.where(correct, np.ceil(winnings), -bet)
+
+            # check if balance is less than initial balance
+            balance = np.maximum(balance, initial_balance)
+
+            peak = np.maximum(peak, balance)
+            drawdown = np.maximum(drawdown, 1 - balance / peak)
+            total += balance
+
+            if return_history:
+                results["history"][start:stop, t] = balance
+
+        results["mean"][start:stop] = total / max(num_matches, 1)
+        results["max"][start:stop] = peak
+        results["final"][start:stop] = balance
+        results["max_drawdown"][start:stop] = drawdown
+
+    return results
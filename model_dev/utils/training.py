@@ -0,0 +1,52 @@
+import torch
+from torch.optim import AdamW, SparseAdam
+
+
+def get_device():
+    """
+    "cuda" when a GPU is available, "cpu" otherwise.
+    """
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def set_threads(num_threads=None, num_interop_threads=None):
+    """
+    Set the number of threads PyTorch uses inside and across operators, ``None`` keeps the default.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    if num_interop_threads:
+        torch.set_num_interop_threads(num_interop_threads)
+
+
+def autocast(device, enabled=True):
+    """
+    Mixed precision context for `device`, bf16 on CPU and fp16 on GPU.
+    """
+    dtype = torch.bfloat16 if device == "cpu" else torch.float16
+    return torch.autocast(device_type=device, dtype=dtype, enabled=enabled)
+
+
+def make_optimizers(model, lr=1e-3):
+    """
+    SparseAdam for the parameters with sparse gradients (sparse embeddings), AdamW for the rest.
+
+    SparseAdam has no weight decay and only updates the moments of the rows in the batch, so sparse embeddings
+    train differently from dense ones, not just faster.
+
+    Returns
+    -------
+    list[torch.optim.Optimizer]
+        The optimizers, step and zero all of them.
+    """
+    sparse, dense = [], []
+    for module in model.modules():
+        is_sparse = getattr(module, "sparse", False) is True
+        for param in module.parameters(recurse=False):
+            (sparse if is_sparse else dense).append(param)
+
+    optimizers = [AdamW(dense, lr=lr)]
+    if sparse:
+        optimizers.append(SparseAdam(sparse, lr=lr))
+
+    return optimizers
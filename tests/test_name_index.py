@@ -0,0 +1,49 @@
+import pytest
+
+from app.utils.name_index import NameIndex
+
+VOCAB = {"Ryu": 0, "Sonic": 1, "Super Mario": 2, "Mega Man": 3, "Dio Brando": 4}
+
+
+@pytest.fixture
+def index():
+    return NameIndex(VOCAB)
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Ryu", 0),
+    ("Megaman", 3),
+    ("mega  man", 3),
+    ("MEGA-MAN", 3),
+    ("Ｓｏｎｉｃ", 1),
+    ("Mega Mna", 3),
+    ("Supre Mario", 2),
+    ("Dio Bando", 4),
+])
+def test_resolves_same_name_and_typos(index, name, expected):
+    assert index.resolve(name) == expected
+
+
+@pytest.mark.parametrize("name", [
+    "Ryu 2",
+    "Sonic 2",
+    "Sonic EX",
+    "Super Mario 64",
+    "Super Mario X",
+    "Mega Man X",
+    "Ken",
+])
+def test_refuses_other_characters(index, name):
+    assert index.resolve(name) is None
+
+
+def test_refuses_ambiguous_typo():
+    index = NameIndex({"Dio Brandy": 0, "Dio Brando": 1})
+    assert index.resolve("Dio Brand") is None
+
+
+def test_counts(index):
+    index.resolve("Ryu")
+    index.resolve("Megaman")
+    index.resolve("Ryu 2")
+    assert index.info() == {"exact": 1, "rescued": 1, "missed": 1}
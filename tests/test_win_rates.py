@@ -0,0 +1,13 @@
+from app.utils.win_rates import WinRateTable
+
+
+def test_record_counts_wins_and_matches():
+    table = WinRateTable()
+    table.record("Ryu", "Ken", "red")
+    assert table.counts == {"Ryu": (1, 1), "Ken": (0, 1)}
+
+
+def test_record_skips_ties():
+    table = WinRateTable()
+    table.record("Ryu", "Ken", None)
+    assert table.counts == {}